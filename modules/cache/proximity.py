@@ -0,0 +1,52 @@
+import threading
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+
+class ProximityCache:
+    """
+    Small semantic cache: a lookup hits when the query embedding's cosine
+    similarity to a cached one is >= tau. Entries live in a fixed ring of
+    `capacity` rows and the oldest is overwritten first.
+    """
+
+    def __init__(self, capacity: int = 128, tau: float = 0.95):
+        self.capacity = max(1, int(capacity))
+        self.tau = float(tau)
+        self.M: Optional[np.ndarray] = None  # (capacity, d) L2-normalized query embeddings
+        self.values: List[Any] = [None] * self.capacity
+        self.size = 0
+        self._next = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _normalize(vec: Sequence[float]) -> np.ndarray:
+        q = np.asarray(vec, dtype=np.float32).ravel()
+        n = np.linalg.norm(q)
+        return q / n if n > 0 else q
+
+    def get(self, vec: Sequence[float]) -> Optional[Any]:
+        q = self._normalize(vec)
+        with self._lock:
+            if not self.size or self.M.shape[1] != q.shape[0]:
+                return None
+            sims = self.M[: self.size] @ q
+            best = int(np.argmax(sims))
+            return self.values[best] if sims[best] >= self.tau else None
+
+    def put(self, vec: Sequence[float], value: Any):
+        q = self._normalize(vec)
+        with self._lock:
+            if self.M is None or self.M.shape[1] != q.shape[0]:
+                self.M = np.zeros((self.capacity, q.shape[0]), dtype=np.float32)
+                self.size = self._next = 0
+            self.M[self._next] = q
+            self.values[self._next] = value
+            self._next = (self._next + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
+    def clear(self):
+        with self._lock:
+            self.values = [None] * self.capacity
+            self.size = self._next = 0
@@ -1,7 +1,8 @@
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
+import hashlib
 import os
 import re
-from modules.model_client import ask_llm
+from modules.model_client import ask_llm, ask_llm_cached, ask_llm_stream, ask_llm_stream_cached
 from modules.store.structured_store import StructuredStore
 
 def os_path_tail(path: str) -> str:
@@ -18,6 +19,47 @@ _MILESTONE_Q = re.compile(
     r"(?:(?P<what4>.+?)\s+date\??$)",
     re.I
 )
+_STOPWORDS_RE = re.compile(r"\b(the|milestone|task|event)\b", re.I)
+_SPAN_TRIGGER_RE = re.compile(r"\b(range|window|between|start|end)\b", re.I)
+
+# --- prompt templates (filled with str.format_map) ---
+_RAG_PROMPT = """You are a grounded assistant. Use ONLY the provided context. If the answer is not present, say you don't know.
+
+Conversation so far:
+{history}
+
+Context:
+{context}
+
+Latest question:
+{message}
+
+Answer (concise, cite facts from the context when possible):
+"""
+
+_MILESTONE_PROMPT = """You are a grounded assistant. Use ONLY the provided context to write one concise sentence that restates the date and gives brief context.
+
+Conversation so far:
+{history}
+
+Context:
+{context}
+
+Instruction:
+Write one short sentence explaining what the milestone is and confirm the date if present. Do not add new facts.
+"""
+
+_SPAN_PROMPT = """Use ONLY the provided context to briefly confirm the date range for the item below.
+
+Conversation so far:
+{history}
+
+Item: {title}
+Context:
+{context}
+
+Answer in one short sentence:
+"""
 
 def _extract_milestone_query(q: str) -> Optional[str]:
     q = q.strip()
@@ -28,7 +70,7 @@ def _extract_milestone_query(q: str) -> Optional[str]:
         s = m.group(k)
         if s:
             # trim generic words like "the", "milestone", etc.
-            s = re.sub(r"\b(the|milestone|task|event)\b", "", s, flags=re.I).strip()
+            s = _STOPWORDS_RE.sub("", s).strip()
             return s
     return None
 
@@ -40,28 +82,68 @@ class ChatEngine:
         # open the same SQLite DB used by the indexer
         db_path = cfg.get("structured_db_path", ".structured.sqlite")
         self.store = StructuredStore(db_path)
+        # on-disk LLM reply cache; set llm_cache.dir to null to disable
+        self.llm_cache_dir = (cfg.get("llm_cache") or {}).get("dir")
+        # source path -> display name; the same few files recur every turn
+        self._basename_cache: Dict[str, str] = {}
+        # rough prompt budget for retrieved passages
+        self.max_context_chars = int(cfg.get("max_context_chars", 6000))
+
+    def _basename(self, path: str) -> str:
+        name = self._basename_cache.get(path)
+        if name is None:
+            name = self._basename_cache[path] = os_path_tail(path)
+        return name
+
+    def _ask(self, prompt: str) -> str:
+        provider = self.cfg["model"]["provider"]
+        model_name = self.cfg["model"]["name"]
+        if self.llm_cache_dir:
+            return ask_llm_cached(provider, model_name, prompt, cache_dir=self.llm_cache_dir)
+        return ask_llm(provider=provider, model_name=model_name, prompt=prompt)
+
+    def _ask_stream(self, prompt: str) -> Iterator[str]:
+        provider = self.cfg["model"]["provider"]
+        model_name = self.cfg["model"]["name"]
+        if self.llm_cache_dir:
+            return ask_llm_stream_cached(provider, model_name, prompt, cache_dir=self.llm_cache_dir)
+        return ask_llm_stream(provider, model_name, prompt)
 
     def _format_history(self) -> str:
-        buf = []
-        for turn in self.history[-6:]:
-            role = turn.get("role", "user")
-            content = turn.get("content", "")
-            if "📂 **Sources:**" in content:
-                content = content.split("📂 **Sources:**")[0].strip()
-            buf.append(f"{role.capitalize()}: {content}")
-        return "\n".join(buf)
+        return "\n".join(
+            f"{t['role'].capitalize()}: {t['content_for_prompt']}" for t in self.history[-6:]
+        )
+
+    def _remember(self, message: str, answer: str, answer_for_prompt: str):
+        """Append a turn; `content` is what was shown, `content_for_prompt` is what later prompts see."""
+        self.history.append({"role": "user", "content": message, "content_for_prompt": message})
+        self.history.append(
+            {"role": "assistant", "content": answer, "content_for_prompt": answer_for_prompt}
+        )
 
     # --- helpers for RAG context formatting ---
     def _format_context_and_sources(self, docs) -> Tuple[str, str]:
         parts = []
         src_lines = []
         uniq = set()
+        seen = set()
+        total = 0
         for d in docs:
-            src = os_path_tail(d.metadata.get("source", "Unknown"))
-            page = d.metadata.get("page") or d.metadata.get("page_number") or d.metadata.get("slide")
-            header = f"[Source: {src}" + (f", page {page}]" if page not in (None, "", 0) else "]")
+            # overlapping chunks often come back verbatim; send each passage once
+            h = hashlib.blake2b(d.page_content.strip().lower().encode(), digest_size=8).digest()
+            if h in seen:
+                continue
+            seen.add(h)
+            if parts and total + len(d.page_content) > self.max_context_chars:
+                break
+            total += len(d.page_content)
+            meta = d.metadata
+            src = self._basename(meta.get("source", "Unknown"))
+            page = meta.get("page") or meta.get("page_number") or meta.get("slide")
+            has_page = page not in (None, "", 0)
+            line = f"{src} (page {page})" if has_page else src
+            header = f"[Source: {src}, page {page}]" if has_page else f"[Source: {src}]"
             parts.append(f"{header}\n{d.page_content}")
-            line = f"{src} (page {page})" if page not in ("", None, 0) else src
             if line not in uniq:
                 uniq.add(line)
                 src_lines.append(f"- {line}")
@@ -79,8 +161,10 @@ class ChatEngine:
         if not topic:
             return None
 
+        # milestones and spans come back from one query
+        hits, span_hits = self.store.get_milestone_or_span(topic)
+
         # 1) milestones (exact dates)
-        hits = self.store.get_milestone(topic)
         if hits:
             # choose the best match (first is fine; they’re substring LIKE)
             slide, title, date_str = hits[0]
@@ -98,30 +182,15 @@ class ChatEngine:
 
             # ask the LLM to write a one-liner explanation *only using* the context
             history_text = self._format_history()
-            prompt = f"""You are a grounded assistant. Use ONLY the provided context to write one concise sentence that restates the date and gives brief context.
-
-Conversation so far:
-{history_text}
-
-Context:
-{context}
-
-Instruction:
-Write one short sentence explaining what the milestone is and confirm the date if present. Do not add new facts.
-"""
-            reply = ask_llm(
-                provider=self.cfg["model"]["provider"],
-                model_name=self.cfg["model"]["name"],
-                prompt=prompt
-            )
+            prompt = _MILESTONE_PROMPT.format_map({"history": history_text, "context": context})
+            reply = self._ask(prompt)
 
             final = f"{fact_line}\n\n{reply}\n\n📂 **Sources:**\n- Slide {slide}\n{sources_text}"
             return final
 
         # 2) spans (if user asked e.g., “What’s the window for X?”)
         # very simple trigger; you can expand later
-        if re.search(r"\b(range|window|between|start|end)\b", user_q, re.I):
-            span_hits = self.store.get_span(topic)
+        if _SPAN_TRIGGER_RE.search(user_q):
             if span_hits:
                 slide, title, start, end = span_hits[0]
                 docs = self.retriever.search(title)
@@ -130,59 +199,40 @@ Write one short sentence explaining what the milestone is and confirm the date i
                 if not docs:
                     return f"{fact}\n\n📂 **Sources:**\n- Slide {slide}"
                 history_text = self._format_history()
-                prompt = f"""Use ONLY the provided context to briefly confirm the date range for the item below.
-
-Conversation so far:
-{history_text}
-
-Item: {title}
-Context:
-{context}
-
-Answer in one short sentence:
-"""
-                reply = ask_llm(
-                    provider=self.cfg["model"]["provider"],
-                    model_name=self.cfg["model"]["name"],
-                    prompt=prompt
+                prompt = _SPAN_PROMPT.format_map(
+                    {"history": history_text, "title": title, "context": context}
                 )
+                reply = self._ask(prompt)
                 return f"{fact}\n\n{reply}\n\n📂 **Sources:**\n- Slide {slide}\n{sources_text}"
 
         return None
 
     # --- main chat ---
     def chat(self, message: str) -> str:
+        return "".join(self.chat_stream(message))
+
+    def chat_stream(self, message: str) -> Iterator[str]:
+        """Yield the answer in chunks; history is updated once the answer is complete."""
         # 1) Try structured first
         structured = self._answer_from_structure(message)
         if structured:
-            self.history.append({"role": "user", "content": message})
-            self.history.append({"role": "assistant", "content": structured})
-            return structured
+            self._remember(message, structured, structured.split("📂 **Sources:**")[0].strip())
+            yield structured
+            return
 
         # 2) Fall back to straight RAG
         results = self.retriever.search(message)
         context, sources_text = self._format_context_and_sources(results)
 
         history_text = self._format_history()
-        prompt = f"""You are a grounded assistant. Use ONLY the provided context. If the answer is not present, say you don't know.
-
-Conversation so far:
-{history_text}
-
-Context:
-{context}
-
-Latest question:
-{message}
-
-Answer (concise, cite facts from the context when possible):
-"""
-        reply = ask_llm(
-            provider=self.cfg["model"]["provider"],
-            model_name=self.cfg["model"]["name"],
-            prompt=prompt
+        prompt = _RAG_PROMPT.format_map(
+            {"history": history_text, "context": context, "message": message}
         )
-        final = f"{reply}\n\n📂 **Sources:**\n{sources_text}"
-        self.history.append({"role": "user", "content": message})
-        self.history.append({"role": "assistant", "content": final})
-        return final
+        reply_buf: List[str] = []
+        for chunk in self._ask_stream(prompt):
+            reply_buf.append(chunk)
+            yield chunk
+        sources_block = f"\n\n📂 **Sources:**\n{sources_text}"
+        yield sources_block
+        reply = "".join(reply_buf)
+        self._remember(message, reply + sources_block, reply.strip())
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Callable, Dict, List
+
+import numpy as np
+
+log = logging.getLogger("embedding_cache")
+
+
+class EmbeddingCache:
+    """
+    Chunk vectors keyed by a hash of (model, text), so unchanged chunks are never re-embedded.
+    Stored as <prefix>.npy (rows, memory-mapped on load) plus <prefix>.json (row keys).
+    """
+
+    def __init__(self, prefix: str, model_name: str):
+        self.vec_path = prefix + ".npy"
+        self.key_path = prefix + ".json"
+        self.model_name = model_name
+        self.rows: Dict[str, int] = {}
+        self.vecs = None
+        self.pending: Dict[str, np.ndarray] = {}  # embedded but not yet written
+        self.touched = set()                      # keys fetched since the last flush
+        try:
+            with open(self.key_path, "r") as f:
+                meta = json.load(f)
+            if meta.get("model") == model_name:
+                self.vecs = np.load(self.vec_path, mmap_mode="r")
+                keys = meta["keys"]
+                if len(keys) == len(self.vecs):
+                    self.rows = {k: i for i, k in enumerate(keys)}
+        except (OSError, ValueError, KeyError):
+            self.rows = {}
+
+    def key(self, text: str) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.model_name.encode())
+        h.update(b"\0")
+        h.update(text.encode())
+        return h.hexdigest()
+
+    def fetch(self, texts: List[str], embed_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Vectors for `texts`; only cache misses go through `embed_fn`.
+        New vectors are held in memory until flush().
+        """
+        keys = [self.key(t) for t in texts]
+        self.touched.update(keys)
+        miss = [i for i, k in enumerate(keys) if k not in self.rows and k not in self.pending]
+        fresh = embed_fn([texts[i] for i in miss]) if miss else None
+        log.info(f"Embedding cache: {len(texts) - len(miss)} hits, {len(miss)} misses.")
+
+        if fresh is not None:
+            dim = fresh.shape[1]
+        elif self.vecs is not None:
+            dim = self.vecs.shape[1]
+        else:
+            dim = next(iter(self.pending.values())).shape[0] if self.pending else 0
+        out = np.empty((len(texts), dim), dtype=np.float32)
+        hit = [i for i, k in enumerate(keys) if k in self.rows]
+        if hit:
+            out[hit] = self.vecs[[self.rows[keys[i]] for i in hit]]
+        for i, k in enumerate(keys):
+            if k in self.pending:
+                out[i] = self.pending[k]
+        if miss:
+            out[miss] = fresh
+            for i in miss:
+                self.pending[keys[i]] = out[i].copy()
+        return out
+
+    def flush(self, prune: bool = False):
+        """
+        Write pending vectors. With prune=True only keys fetched since the last
+        flush are kept (use after a full rebuild, to drop removed chunks).
+        """
+        keep = [k for k in self.rows if not prune or k in self.touched]
+        if self.pending or len(keep) != len(self.rows):
+            self._save(keep)
+        self.touched = set()
+
+    def embed(self, texts: List[str], embed_fn: Callable[[List[str]], np.ndarray], prune: bool = False) -> np.ndarray:
+        """fetch() + flush() in one call."""
+        out = self.fetch(texts, embed_fn)
+        self.flush(prune)
+        return out
+
+    def _save(self, keep: List[str]):
+        parts = []
+        if keep:
+            parts.append(np.asarray(self.vecs[[self.rows[k] for k in keep]]))
+        if self.pending:
+            parts.append(np.stack(list(self.pending.values())))
+        order = keep + list(self.pending)
+        data = np.concatenate(parts) if parts else np.empty((0, 0), dtype=np.float32)
+        os.makedirs(os.path.dirname(self.vec_path) or ".", exist_ok=True)
+        tmp = self.vec_path + ".tmp.npy"
+        np.save(tmp, np.ascontiguousarray(data, dtype=np.float32))
+        os.replace(tmp, self.vec_path)
+        tmp = self.key_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"model": self.model_name, "keys": order}, f)
+        os.replace(tmp, self.key_path)
+        self.vecs = np.load(self.vec_path, mmap_mode="r")
+        self.rows = {k: i for i, k in enumerate(order)}
+        self.pending = {}
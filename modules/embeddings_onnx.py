@@ -0,0 +1,77 @@
+import logging
+import os
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+log = logging.getLogger("embeddings_onnx")
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformer embeddings served by ONNX Runtime (via optimum).
+    Mean-pooled and L2-normalised, matching the HuggingFaceEmbeddings setup in indexer.
+    The exported model is cached in `cache_dir`, so export only happens once.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str, batch_size: int = 128, max_length: int = 256):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        provider = "CPUExecutionProvider"
+        try:
+            import onnxruntime
+
+            if "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+                provider = "CUDAExecutionProvider"
+        except ImportError:
+            pass
+
+        if os.path.exists(os.path.join(cache_dir, "model.onnx")):
+            self.model = ORTModelForFeatureExtraction.from_pretrained(cache_dir, provider=provider)
+            self.tokenizer = AutoTokenizer.from_pretrained(cache_dir)
+        else:
+            log.info(f"Exporting {model_name} to ONNX in {cache_dir} ...")
+            self.model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True, provider=provider)
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            self.model.save_pretrained(cache_dir)
+            self.tokenizer.save_pretrained(cache_dir)
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """(N, d) float32 array of normalised embeddings."""
+        texts = [t.replace("\n", " ") for t in texts]
+        # length-sorted batches keep padding (wasted compute) down
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = None
+        for start in range(0, len(texts), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            enc = self.tokenizer(
+                [texts[i] for i in idx],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            hidden = self.model(**enc).last_hidden_state
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            if out is None:
+                out = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            out[idx] = pooled
+        return out if out is not None else np.empty((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+@lru_cache(maxsize=2)
+def load_onnx_embeddings(model_name: str, cache_dir: str, batch_size: int = 128) -> OnnxEmbeddings:
+    return OnnxEmbeddings(model_name, cache_dir, batch_size=batch_size)
@@ -5,6 +5,8 @@ class IndexManifest:
     def __init__(self, path: str):
         self.path = path
         self.data: Dict[str, float] = {}
+        # set by any change to `data`; save() is a no-op while clean
+        self.dirty = False
         if os.path.exists(path):
             try:
                 with open(path, "r") as f:
@@ -29,12 +31,44 @@ class IndexManifest:
                 unchanged.append(f)
         return changed, unchanged
 
+    def diff_with_mtimes(self, files_with_mtimes):
+        """Like diff(), for (path, mtime) pairs already stat'ed by the caller; returns pairs."""
+        changed, unchanged = [], []
+        for f, m in files_with_mtimes:
+            if self.data.get(f) != m:
+                changed.append((f, m))
+            else:
+                unchanged.append((f, m))
+        return changed, unchanged
+
+    def missing(self, files):
+        """Return tracked paths that are no longer among `files` (deleted/moved)."""
+        present = set(files)
+        return [f for f in self.data if f not in present]
+
     def update(self, files):
         for f in files:
             self.data[f] = self.mtime(f)
+            self.dirty = True
+
+    def update_with_mtimes(self, files_with_mtimes):
+        for f, m in files_with_mtimes:
+            if self.data.get(f) != m:
+                self.data[f] = m
+                self.dirty = True
+
+    def forget(self, files):
+        for f in files:
+            if self.data.pop(f, None) is not None:
+                self.dirty = True
 
     def save(self):
+        if not self.dirty:
+            return
         tmp = self.path + ".tmp"
         with open(tmp, "w") as f:
             json.dump(self.data, f)
+            f.flush()
+            os.fsync(f.fileno())
         os.replace(tmp, self.path)
+        self.dirty = False
@@ -1,9 +1,15 @@
 import os
+import json
 import logging
+import math
 import re
-import pandas as pd
-import nltk
-from typing import List, Dict, Tuple
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property, lru_cache
+from itertools import repeat
+import faiss
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from langchain_community.document_loaders import (
     PyPDFLoader,
@@ -13,42 +19,326 @@ from langchain_community.document_loaders import (
 )
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain.schema import Document
 
-from .parsers.pptx_visuals import parse_pptx_visuals
+from .embedding_cache import EmbeddingCache
 from .store.structured_store import StructuredStore
 from .index_manifest import IndexManifest
 
 log = logging.getLogger("indexer")
 
-# Ensure punkt
-try:
-    nltk.data.find("tokenizers/punkt")
-except LookupError:
-    nltk.download("punkt")
+
+@lru_cache(maxsize=None)
+def _ensure_punkt():
+    """Make sure NLTK's punkt data is on disk; only the Unstructured loaders need it."""
+    # exported once punkt is known to be present; child processes (and anything
+    # launched with it set) skip NLTK's data-path walk
+    if os.environ.get("ASO_PUNKT_OK"):
+        return
+    import nltk
+
+    try:
+        nltk.data.find("tokenizers/punkt")
+    except LookupError:
+        if not nltk.download("punkt"):
+            return
+    os.environ["ASO_PUNKT_OK"] = "1"
+
+
+def _embedding_device() -> str:
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+@lru_cache(maxsize=2)
+def _load_embeddings(
+    model_name: str,
+    batch_size: int,
+    compile_model: bool = False,
+    dtype: str = "float32",
+    threads: int = 0,
+) -> HuggingFaceEmbeddings:
+    # shared across IndexBuilder instances so a UI re-index doesn't reload the model
+    model_kwargs = {"device": _embedding_device()}
+    if dtype != "float32" or threads:
+        import torch
+
+        if threads:
+            torch.set_num_threads(threads)
+        if dtype != "float32":
+            # forwarded by SentenceTransformer to transformers' from_pretrained
+            model_kwargs["model_kwargs"] = {"torch_dtype": getattr(torch, dtype)}
+    emb = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs={
+            "batch_size": batch_size,
+            "normalize_embeddings": True,
+        },
+    )
+    if compile_model:
+        _compile_encoder(emb)
+    return emb
+
+
+def _compile_encoder(emb: HuggingFaceEmbeddings):
+    """torch.compile the transformer inside the SentenceTransformer; eager on failure."""
+    try:
+        import torch
+
+        module = emb.client[0]
+        module.auto_model = torch.compile(module.auto_model, mode="reduce-overhead", dynamic=True)
+    except Exception as e:
+        log.warning(f"torch.compile unavailable, using eager embeddings: {e}")
+
+
+def _load_pptx(file: str, out: List[Document], use_unstructured_pptx: bool = False) -> Dict:
+    """Captions + slide text Documents; returns the structured rows from the visual parser."""
+    from .parsers.pptx_visuals import parse_pptx_visuals
+
+    # ---- 1) Structured + captions via our visual parser ----
+    captions, structured = parse_pptx_visuals(file)
+    slide_texts = structured.pop("slide_texts", [])
+
+    # add captions as short slide-level docs to vector index
+    for cap in captions:
+        # try to recover slide number from "Slide N:" prefix (not mandatory)
+        m = re.match(r"Slide\s+(\d+):\s*(.*)", cap)
+        slide_num = int(m.group(1)) if m else None
+        content = m.group(2) if m else cap
+        out.append(
+            Document(
+                page_content=content,
+                metadata={
+                    "source": file,
+                    **({"slide": slide_num} if slide_num else {}),
+                    "kind": "pptx_caption",
+                },
+            )
+        )
+
+    # ---- 2) Raw slide text as well (for broader recall) ----
+    if use_unstructured_pptx:
+        try:
+            raw_chunks = UnstructuredPowerPointLoader(file).load()
+            for d in raw_chunks:
+                d.metadata["source"] = file
+                d.metadata.setdefault("kind", "pptx_text")
+            out.extend(raw_chunks)
+        except Exception as e:
+            log.warning(f"Unstructured PPTX loader failed for {file}: {e}")
+    else:
+        # the visual parser already walked every text box; reuse its text
+        for i, slide_text in enumerate(slide_texts, 1):
+            if slide_text:
+                out.append(
+                    Document(
+                        page_content=slide_text,
+                        metadata={"source": file, "slide": i, "kind": "pptx_text"},
+                    )
+                )
+    return structured
+
+
+def _load_pdf(file: str, out: List[Document]):
+    pdf_docs = PyPDFLoader(file).load()
+    for d in pdf_docs:
+        d.metadata["source"] = file
+        if "page" not in d.metadata and "page_number" in d.metadata:
+            d.metadata["page"] = d.metadata["page_number"]
+    out.extend(pdf_docs)
+
+
+def _load_docx(file: str, out: List[Document]):
+    chunks = UnstructuredWordDocumentLoader(file).load()
+    for d in chunks:
+        d.metadata["source"] = file
+    out.extend(chunks)
+
+
+def _load_txt(file: str, out: List[Document]):
+    chunks = TextLoader(file).load()
+    for d in chunks:
+        d.metadata["source"] = file
+    out.extend(chunks)
+
+
+def _load_one(file: str, use_unstructured_pptx: bool = False) -> Tuple[List[Document], Dict]:
+    """
+    Parse a single file into text Documents plus structured rows (PPTX only).
+    Top-level and side-effect free so it can run in a worker process; the
+    caller writes the structured rows to SQLite.
+    """
+    docs: List[Document] = []
+    structured: Dict = {}
+    try:
+        ext = os.path.splitext(file)[1].lower()
+        if ext == ".pptx":
+            structured = _load_pptx(file, docs, use_unstructured_pptx)
+        else:
+            loader = _LOADERS.get(ext)
+            if loader is not None:
+                loader(file, docs)
+    except Exception as e:
+        log.exception(f"Error loading {file}: {e}")
+
+    return docs, structured
+
+
+def _funnel_rows(file: str) -> List[List[str]]:
+    """
+    First sheet as rectangular rows of stripped strings, read with openpyxl's
+    streaming read-only reader instead of building a DataFrame. Values are
+    rendered the way pandas' reader + to_numpy(dtype=str) renders them.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = []
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            # pandas turns integral floats into ints and "" into missing
+            cells = [
+                int(v) if isinstance(v, float) and v.is_integer() else (None if v == "" else v)
+                for v in row
+            ]
+            while cells and cells[-1] is None:  # trailing empties are trimmed
+                cells.pop()
+            rows.append(cells)
+    finally:
+        wb.close()
+    while rows and not rows[-1]:
+        rows.pop()
+    width = max(map(len, rows), default=0)
+    for r in rows:
+        r.extend([None] * (width - len(r)))
+
+    # a purely numeric column with gaps or fractions becomes float64 in pandas ("1.0")
+    as_float = []
+    for col in zip(*rows):
+        vals = [v for v in col if v is not None]
+        numeric = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in vals)
+        as_float.append(
+            bool(vals) and numeric
+            and (len(vals) < len(col) or any(isinstance(v, float) for v in vals))
+        )
+    return [
+        [
+            "" if v is None else str(float(v) if f else v).strip()
+            for v, f in zip(r, as_float)
+        ]
+        for r in rows
+    ]
+
+
+def _load_xlsx(file: str, out: List[Document]):
+    try:
+        if "Personalization_Funnel.xlsx" in file:
+            log.info(f"Special handling for {file}")
+            rows = _funnel_rows(file)
+            dates = rows[0][2:] if rows else []
+            lines = []
+            for platform, step, *vals in rows[4:]:
+                lines.extend(
+                    f"Platform: {platform} | Step: {step} | Date: {d} | Value: {v}"
+                    for d, v in zip(dates, vals)
+                )
+            out.append(
+                Document(
+                    page_content="\n".join(lines), metadata={"source": file}
+                )
+            )
+            return
+
+        import pandas as pd
+
+        # Generic path: render each sheet row-wise, cap massive sheets
+        MAX_ROWS = 2000
+        # nrows stops openpyxl at the cap instead of parsing the whole sheet first
+        sheets = pd.read_excel(file, sheet_name=None, engine="openpyxl", nrows=MAX_ROWS)
+        parts = []
+        for name, sdf in sheets.items():
+            arr = np.char.strip(sdf.to_numpy(dtype=str, na_value=""))
+            parts.extend(f"[{name}] " + " | ".join(row) for row in arr.tolist())
+        out.append(Document(page_content="\n".join(parts), metadata={"source": file}))
+    except Exception as e:
+        log.warning(f"Skipping XLSX file {file}: {e}")
+
+
+# extension -> loader for everything except PPTX (which also returns structured rows)
+_LOADERS = {
+    ".pdf": _load_pdf,
+    ".docx": _load_docx,
+    ".txt": _load_txt,
+    ".xlsx": _load_xlsx,
+}
 
 
 class IndexBuilder:
     """Builds or loads FAISS index. Also populates StructuredStore (milestones/spans)."""
 
     SUPPORTED_EXTS = (".pdf", ".docx", ".txt", ".pptx", ".xlsx")
+    # non-hidden names with a supported extension, any case, in one C-level match
+    _SUPPORTED_RE = re.compile(
+        r"[^.].*\.(?:%s)" % "|".join(e.lstrip(".") for e in SUPPORTED_EXTS), re.I
+    )
+    INDEX_TYPES = ("flat", "hnsw", "ivf", "sq8", "fp16", "ivf_sq8")
 
     def __init__(self, cfg: dict):
         self.cfg = cfg
         self.data_dir = cfg["data_dir"]
         self.index_dir = cfg["index_dir"]
         self.manifest = IndexManifest(cfg.get("manifest_path", ".index_manifest.json"))
-        self.embedding_model = HuggingFaceEmbeddings(model_name=cfg["embedding_model"])
         self.db = None
+        # source path -> docstore ids, persisted next to the index
+        self._source_to_ids: Dict[str, List[str]] = defaultdict(list)
 
         self.chunk_size = int(cfg.get("chunk_size", 500))
         self.chunk_overlap = int(cfg.get("chunk_overlap", 50))
+        if cfg.get("text_splitter", "recursive") == "token":
+            # tiktoken-backed; chunk_size/chunk_overlap are then counted in tokens
+            from langchain_text_splitters import TokenTextSplitter
+
+            self.splitter = TokenTextSplitter(
+                chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
+            )
+        else:
+            self.splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+                separators=["\n\n", "\n", " ", ""],
+            )
 
         # structured store for precise answers
         self.store_path = cfg.get("structured_db_path", ".structured.sqlite")
         self.store = StructuredStore(self.store_path)
 
+    @cached_property
+    def embedding_model(self) -> Embeddings:
+        # loaded on first use, not at construction
+        if self.cfg.get("embedding_backend", "torch") == "onnx":
+            from .embeddings_onnx import load_onnx_embeddings
+
+            return load_onnx_embeddings(
+                self.cfg["embedding_model"],
+                self.cfg.get("onnx_dir") or self.index_dir.rstrip("/\\") + "_onnx",
+                int(self.cfg.get("embed_batch_size", 128)),
+            )
+        return _load_embeddings(
+            self.cfg["embedding_model"],
+            int(self.cfg.get("embed_batch_size", 128)),
+            bool(self.cfg.get("embedding_compile", False)),
+            str(self.cfg.get("embedding_dtype") or "float32"),
+            int(self.cfg.get("embedding_threads") or 0),
+        )
+
     # ----- public entry -----
     def build_index(self, force_rebuild: bool = False):
         if self.cfg.get("reindex_on_start"):
@@ -61,14 +351,16 @@ class IndexBuilder:
                     self.embedding_model,
                     allow_dangerous_deserialization=True,
                 )
+                self._tune_index()
+                self._load_source_ids()
                 log.info("Loaded existing FAISS index.")
                 if self.cfg.get("incremental_index", True):
-                    changed, _ = self._scan_changed()
-                    if changed:
+                    changed, removed = self._scan_changed()
+                    if changed or removed:
                         log.info(
-                            f"Detected {len(changed)} changed/new files; rebuilding."
+                            f"Detected {len(changed)} changed/new and {len(removed)} removed files; updating."
                         )
-                        return self._full_rebuild()
+                        return self._incremental_update(changed, removed)
                 return
             except Exception:
                 log.info("No existing index found or incompatible. Building anew.")
@@ -76,164 +368,303 @@ class IndexBuilder:
         return self._full_rebuild()
 
     # ----- helpers -----
-    def _gather_files(self) -> List[str]:
-        files = []
-        for f in os.listdir(self.data_dir):
-            if f.startswith("."):
-                continue
-            if f.lower().endswith(self.SUPPORTED_EXTS):
-                files.append(os.path.join(self.data_dir, f))
+    def _gather_files(self) -> List[Tuple[str, float]]:
+        """Sorted (path, mtime) pairs; one scandir pass lists and stats each file once."""
+        match = self._SUPPORTED_RE.fullmatch
+        with os.scandir(self.data_dir) as it:
+            files = [(e.path, e.stat().st_mtime) for e in it if match(e.name)]
         return sorted(files)
 
-    def _scan_changed(self) -> Tuple[List[str], List[str]]:
+    def _scan_changed(self) -> Tuple[List[Tuple[str, float]], List[str]]:
+        """Return (changed/new (path, mtime) pairs, removed paths) relative to the manifest."""
         files = self._gather_files()
-        changed, unchanged = self.manifest.diff(files)
+        changed, unchanged = self.manifest.diff_with_mtimes(files)
+        removed = self.manifest.missing([f for f, _ in files])
         log.info(
-            f"Scanned {len(files)} files | changed/new: {len(changed)}, unchanged: {len(unchanged)}"
+            f"Scanned {len(files)} files | changed/new: {len(changed)}, unchanged: {len(unchanged)}, removed: {len(removed)}"
         )
-        return changed, unchanged
+        return changed, removed
 
     def _load_documents(self, files: List[str]) -> List[Document]:
         """
         Returns text Documents for semantic index (FAISS).
         Also side-effect: populates structured store for PPTX.
+        Files are parsed in parallel worker processes.
         """
-        docs: List[Document] = []
-
-        for file in files:
-            try:
-                ext = file.lower().rsplit(".", 1)[-1]
-
-                if ext == "pptx":
-                    # ---- 1) Structured + captions via our visual parser ----
-                    captions, structured = parse_pptx_visuals(file)
-
-                    # store structured rows (milestones/spans)
-                    # wipe existing rows for a rebuild handled in _full_rebuild()
-                    self.store.add_milestones(structured.get("milestones", []))
-                    self.store.add_spans(structured.get("spans", []))
-
-                    # add captions as short slide-level docs to vector index
-                    for cap in captions:
-                        # try to recover slide number from "Slide N:" prefix (not mandatory)
-                        m = re.match(r"Slide\s+(\d+):\s*(.*)", cap)
-                        slide_num = int(m.group(1)) if m else None
-                        content = m.group(2) if m else cap
-                        docs.append(
-                            Document(
-                                page_content=content,
-                                metadata={
-                                    "source": file,
-                                    **({"slide": slide_num} if slide_num else {}),
-                                    "kind": "pptx_caption",
-                                },
-                            )
-                        )
+        return [d for file_docs in self._iter_documents(files) for d in file_docs]
 
-                    # ---- 2) Also drop in the raw Unstructured loader (for broader recall) ----
-                    try:
-                        raw_chunks = UnstructuredPowerPointLoader(file).load()
-                        for d in raw_chunks:
-                            d.metadata["source"] = file
-                            d.metadata.setdefault("kind", "pptx_text")
-                        docs.extend(raw_chunks)
-                    except Exception as e:
-                        log.warning(f"Unstructured PPTX loader failed for {file}: {e}")
-
-                elif ext == "pdf":
-                    pdf_docs = PyPDFLoader(file).load()
-                    for d in pdf_docs:
-                        d.metadata["source"] = file
-                        if "page" not in d.metadata and "page_number" in d.metadata:
-                            d.metadata["page"] = d.metadata["page_number"]
-                    docs.extend(pdf_docs)
-
-                elif ext == "docx":
-                    chunks = UnstructuredWordDocumentLoader(file).load()
-                    for d in chunks:
-                        d.metadata["source"] = file
-                    docs.extend(chunks)
-
-                elif ext == "txt":
-                    chunks = TextLoader(file).load()
-                    for d in chunks:
-                        d.metadata["source"] = file
-                    docs.extend(chunks)
-
-                elif ext == "xlsx":
-                    self._load_xlsx(file, docs)
-
-            except Exception as e:
-                log.exception(f"Error loading {file}: {e}")
-
-        return docs
-
-    def _load_xlsx(self, file: str, out: List[Document]):
+    def _iter_documents(
+        self, files: List[str], structured_out: Optional[List[Dict]] = None
+    ) -> Iterator[List[Document]]:
+        """
+        Like _load_documents, but yields each file's Documents as soon as it is parsed.
+        Given `structured_out`, each file's structured rows are appended to it
+        instead of being written to the store.
+        """
+        use_unstructured_pptx = bool(self.cfg.get("use_unstructured_pptx", False))
+        if any(f.lower().endswith(".docx") or (use_unstructured_pptx and f.lower().endswith(".pptx")) for f in files):
+            _ensure_punkt()
+
+        # parsing scales to a handful of workers before PDF/PPTX I/O and pickling dominate
+        workers = int(self.cfg.get("load_workers") or min(os.cpu_count() or 1, 6))
+        workers = min(workers, len(files))
+        ex = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
         try:
-            if "Personalization_Funnel.xlsx" in file:
-                log.info(f"Special handling for {file}")
-                df = pd.read_excel(file, header=None, engine="openpyxl")
-                lines = []
-                for r in range(4, df.shape[0]):
-                    platform = str(df.iloc[r, 0]).strip()
-                    step = str(df.iloc[r, 1]).strip()
-                    for c in range(2, df.shape[1]):
-                        date = str(df.iloc[0, c]).strip()
-                        val = str(df.iloc[r, c]).strip()
-                        lines.append(
-                            f"Platform: {platform} | Step: {step} | Date: {date} | Value: {val}"
-                        )
-                out.append(
-                    Document(
-                        page_content="\n".join(lines), metadata={"source": file}
+            # files vary widely in cost, so hand them out one at a time; results are
+            # consumed as they arrive, overlapping SQLite writes with parsing
+            flags = repeat(use_unstructured_pptx)
+            results = ex.map(_load_one, files, flags, chunksize=1) if ex else map(_load_one, files, flags)
+            for file_docs, structured in results:
+                # store structured rows (milestones/spans); a full rebuild
+                # collects them and writes them all at the end instead
+                if structured and structured_out is not None:
+                    structured_out.append(structured)
+                elif structured:
+                    # one transaction per file
+                    self.store.bulk_load(
+                        statuses=structured.get("statuses", []),
+                        milestones=structured.get("milestones", []),
+                        spans=structured.get("spans", []),
                     )
+                yield file_docs
+        finally:
+            if ex:
+                ex.shutdown()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts straight into an (N, d) float32 array.
+        SentenceTransformer.encode already length-sorts each batch to limit padding;
+        calling it directly skips langchain's ndarray -> list-of-lists round trip.
+        """
+        emb = self.embedding_model
+        if hasattr(emb, "encode"):  # OnnxEmbeddings
+            return emb.encode(texts)
+        client = getattr(emb, "client", None)
+        if not hasattr(client, "encode"):
+            return np.asarray(emb.embed_documents(texts), dtype="float32")
+        texts = [t.replace("\n", " ") for t in texts]  # as HuggingFaceEmbeddings does
+        return client.encode(
+            texts, show_progress_bar=False, convert_to_numpy=True, **emb.encode_kwargs
+        ).astype("float32", copy=False)
+
+    def _embedding_cache(self) -> Optional[EmbeddingCache]:
+        if not self.cfg.get("embedding_cache", True):
+            return None
+        backend = self.cfg.get("embedding_backend", "torch")
+        key = f"{self.cfg['embedding_model']}:{backend}"
+        if backend != "onnx":
+            # the weights' dtype changes the vectors; batch size, threads and
+            # torch.compile do not, and normalization is always on
+            key += ":" + str(self.cfg.get("embedding_dtype") or "float32")
+        return EmbeddingCache(os.path.join(self.index_dir, "emb_cache"), key)
+
+    def _embed_cached(self, texts: List[str]) -> np.ndarray:
+        """_embed, but chunks whose text was embedded before are served from the on-disk cache."""
+        cache = self._embedding_cache()
+        if cache is None:
+            return self._embed(texts)
+        return cache.embed(texts, self._embed)
+
+    def _split(self, raw_docs: List[Document]) -> List[Document]:
+        return self.splitter.split_documents(raw_docs)
+
+    def _index_type(self, n: int) -> str:
+        kind = str(self.cfg.get("faiss_index_type", "auto")).lower()
+        if kind == "auto":
+            # exact search is cheap (and supports deletes) until the corpus gets large
+            kind = "hnsw" if n >= int(self.cfg.get("ann_min_vectors", 10000)) else "flat"
+        if kind not in self.INDEX_TYPES:
+            raise ValueError(f"Unsupported faiss_index_type: {kind}")
+        return kind
+
+    def _build_faiss(self, texts: List[str], vecs: np.ndarray, metadatas: List[dict]) -> FAISS:
+        kind = self._index_type(len(vecs))
+        arr = np.ascontiguousarray(vecs, dtype="float32")
+        faiss.normalize_L2(arr)
+        d = arr.shape[1]
+        strategy = DistanceStrategy.MAX_INNER_PRODUCT
+        if kind == "flat":
+            # exact search; on unit vectors inner product ranks like cosine
+            index = faiss.IndexFlatIP(d)
+        elif kind == "hnsw":
+            index = faiss.IndexHNSWFlat(d, int(self.cfg.get("hnsw_m", 32)))
+            index.hnsw.efConstruction = int(self.cfg.get("hnsw_ef_construction", 200))
+            strategy = DistanceStrategy.EUCLIDEAN_DISTANCE
+        elif kind == "sq8":
+            # 1 byte per dimension: 4x less memory traffic per scanned vector
+            index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        elif kind == "fp16":
+            index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+        else:  # ivf / ivf_sq8
+            nlist = int(self.cfg.get("ivf_nlist") or max(32, 4 * math.sqrt(len(arr))))
+            nlist = max(1, min(nlist, len(arr)))  # k-means needs at least nlist points
+            quantizer = faiss.IndexFlatIP(d)
+            if kind == "ivf":
+                index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexIVFScalarQuantizer(
+                    quantizer, d, nlist, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
                 )
-                return
+        if not index.is_trained:
+            index.train(arr)
+        # one bulk add; the docstore is filled directly instead of per document
+        index.add(arr)
 
-            # Generic path: render each sheet row-wise, cap massive sheets
-            sheets = pd.read_excel(file, sheet_name=None, engine="openpyxl")
-            MAX_ROWS = 2000
-            parts = []
-            for name, sdf in sheets.items():
-                rows = min(sdf.shape[0], MAX_ROWS)
-                for i in range(rows):
-                    row = [str(sdf.iloc[i, j]).strip() for j in range(sdf.shape[1])]
-                    parts.append(f"[{name}] " + " | ".join(row))
-            out.append(Document(page_content="\n".join(parts), metadata={"source": file}))
+        docstore = InMemoryDocstore(
+            {str(i): Document(page_content=t, metadata=m) for i, (t, m) in enumerate(zip(texts, metadatas))}
+        )
+        index_to_id = {i: str(i) for i in range(len(texts))}
+        return FAISS(self.embedding_model, index, docstore, index_to_id, distance_strategy=strategy)
+
+    def _tune_index(self):
+        """Apply query-time knobs, which FAISS does not persist with the index."""
+        index = self.db.index
+        if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            self.db.distance_strategy = DistanceStrategy.MAX_INNER_PRODUCT
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = int(self.cfg.get("hnsw_ef", 64))
+        elif isinstance(index, faiss.IndexIVF):
+            index.nprobe = int(self.cfg.get("ivf_nprobe", 8))
+
+    def _supports_delete(self) -> bool:
+        # HNSW cannot remove vectors at all; IVF can, but keeps the remaining ids
+        # sparse, which breaks FAISS-langchain's positional id -> docstore mapping.
+        return not isinstance(self.db.index, (faiss.IndexHNSW, faiss.IndexIVF))
+
+    # ----- source -> ids sidecar -----
+    def _source_ids_path(self) -> str:
+        return os.path.join(self.index_dir, "source_ids.json")
+
+    def _index_sources(self, ids: List[str], metadatas: List[dict]):
+        for id_, meta in zip(ids, metadatas):
+            self._source_to_ids[meta.get("source")].append(id_)
+
+    def _load_source_ids(self):
+        """Read the sidecar; rescan the docstore once if it is missing or out of step."""
+        self._source_to_ids = defaultdict(list)
+        try:
+            with open(self._source_ids_path(), "r") as f:
+                self._source_to_ids.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        if sum(map(len, self._source_to_ids.values())) != len(self.db.index_to_docstore_id):
+            docstore = self.db.docstore._dict
+            self._source_to_ids = defaultdict(list)
+            self._index_sources(list(docstore), [d.metadata for d in docstore.values()])
+
+    def _save_source_ids(self):
+        path = self._source_ids_path()
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._source_to_ids, f)
+        os.replace(tmp, path)
+
+    def _analyze_store(self):
+        try:
+            self.store.analyze()
         except Exception as e:
-            log.warning(f"Skipping XLSX file {file}: {e}")
-
-    def _full_rebuild(self):
-        files = self._gather_files()
+            log.warning(f"Structured store ANALYZE failed (continuing): {e}")
+
+    def _incremental_update(self, changed: List[Tuple[str, float]], removed: List[str]):
+        """Re-embed only changed/new files and drop vectors of changed/removed ones."""
+        paths = [f for f, _ in changed]
+        stale = set(paths) | set(removed)
+        if not self._supports_delete() and any(s in self._source_to_ids for s in stale):
+            log.info(f"{type(self.db.index).__name__} cannot delete vectors; rebuilding.")
+            return self._full_rebuild()
+        ids = [id_ for s in stale for id_ in self._source_to_ids.pop(s, ())]
+        if ids:
+            self.db.delete(ids)
 
-        # wipe structured store for a clean rebuild (if the class has reset)
         try:
-            if hasattr(self.store, "reset"):
-                self.store.reset()
-            else:
-                # fallback: basic truncate
-                self.store.conn.execute("DELETE FROM milestones")
-                self.store.conn.execute("DELETE FROM spans")
-                self.store.conn.execute("DELETE FROM statuses")
-                self.store.conn.commit()
+            self.store.delete_sources(stale)
         except Exception as e:
-            log.warning(f"Structured store reset failed (continuing): {e}")
-
-        raw_docs = self._load_documents(files)
+            log.warning(f"Structured store cleanup failed (continuing): {e}")
+
+        raw_docs = self._load_documents(paths)
+        chunks = self._split(raw_docs)
+        if chunks:
+            texts = [c.page_content for c in chunks]
+            vecs = self._embed_cached(texts)
+            metadatas = [c.metadata for c in chunks]
+            new_ids = self.db.add_embeddings(list(zip(texts, vecs)), metadatas=metadatas)
+            self._index_sources(new_ids, metadatas)
+        self.db.save_local(self.index_dir)
+        self._save_source_ids()
+        self._analyze_store()
+        self.manifest.update_with_mtimes(changed)
+        self.manifest.forget(removed)
+        self.manifest.save()
         log.info(
-            f"Loaded {len(raw_docs)} documents. Splitting size={self.chunk_size}, overlap={self.chunk_overlap}..."
+            f"Updated FAISS index: -{len(ids)} stale vectors, +{len(chunks)} chunks."
         )
 
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            separators=["\n\n", "\n", " ", ""],
-        )
-        chunks = splitter.split_documents(raw_docs)
-        log.info(f"Split into {len(chunks)} chunks. Building FAISS...")
+    def _replace_structured(self, structured: List[Dict]):
+        """
+        Swap the store's rows for a rebuild's parser output in one short
+        transaction (bulk_load with replace=True, fsync off): readers on other
+        connections, like the chat UI, see the old rows until it commits, and
+        a build that fails before this point leaves them untouched.
+        """
+        try:
+            self.store.bulk_load(
+                statuses=[r for s in structured for r in s.get("statuses", [])],
+                milestones=[r for s in structured for r in s.get("milestones", [])],
+                spans=[r for s in structured for r in s.get("spans", [])],
+                replace=True,
+            )
+        except Exception as e:
+            log.warning(f"Structured store reload failed (continuing): {e}")
+
+    def _full_rebuild(self):
+        files = self._gather_files()
 
-        self.db = FAISS.from_documents(chunks, self.embedding_model)
+        # Stream parse -> split -> embed: each file's raw Documents are dropped once
+        # split, and chunks are embedded in large batches while workers keep parsing.
+        # Only chunk texts/metadata and the float32 vectors are held until the build.
+        cache = self._embedding_cache()
+        batch = int(self.cfg.get("embed_batch_size", 128)) * 16
+        texts: List[str] = []
+        metadatas: List[dict] = []
+        vec_parts: List[np.ndarray] = []
+        pending: List[Document] = []
+        n_docs = 0
+
+        def drain():
+            t = [c.page_content for c in pending]
+            vec_parts.append(cache.fetch(t, self._embed) if cache else self._embed(t))
+            texts.extend(t)
+            metadatas.extend(c.metadata for c in pending)
+            pending.clear()
+
+        # Structured rows are held until the index is saved rather than committed
+        # per file (as incremental updates do), so the store is not emptied while
+        # the corpus is parsed and embedded; see _replace_structured.
+        structured: List[Dict] = []
+        log.info(f"Loading, splitting (size={self.chunk_size}, overlap={self.chunk_overlap}) and embedding...")
+        for file_docs in self._iter_documents([f for f, _ in files], structured):
+            n_docs += len(file_docs)
+            pending.extend(self._split(file_docs))
+            if len(pending) >= batch:
+                drain()
+        if pending or not vec_parts:
+            drain()
+        if cache:
+            cache.flush(prune=True)
+        vecs = np.concatenate(vec_parts)
+        del vec_parts
+        log.info(f"Embedded {len(texts)} chunks from {n_docs} documents. Building FAISS...")
+
+        self.db = self._build_faiss(texts, vecs, metadatas)
+        self._tune_index()
+        self._source_to_ids = defaultdict(list)
+        self._index_sources([self.db.index_to_docstore_id[i] for i in range(len(texts))], metadatas)
         self.db.save_local(self.index_dir)
-        self.manifest.update(files)
+        self._save_source_ids()
+        self._replace_structured(structured)
+        self._analyze_store()
+        self.manifest.forget(self.manifest.missing([f for f, _ in files]))
+        self.manifest.update_with_mtimes(files)
         self.manifest.save()
         log.info("Built and saved FAISS index.")
@@ -1,14 +1,26 @@
+import hashlib
+import json
 import os
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterator, Optional
 
 # Thin abstraction so we can swap providers via config.
 from interlinked import AI
 from interlinked.core.clients.googleaiclient import GoogleAIClient
 
+@lru_cache(maxsize=8)
+def _google_client(model_name: str) -> GoogleAIClient:
+    # one client per model for the process, so its HTTP session and
+    # keep-alive connections are reused across calls
+    return GoogleAIClient(model_name=model_name)
+
 # Placeholder: extend to support OpenAI or a mock client if needed.
 def ask_llm(provider: str, model_name: str, prompt: str) -> str:
     provider = (provider or "google").lower()
     if provider == "google":
-        client = GoogleAIClient(model_name=model_name)
+        client = _google_client(model_name)
         response = AI.ask(prompt=prompt, client=client)
         # Try a few shapes to extract text
         try:
@@ -23,3 +35,74 @@ def ask_llm(provider: str, model_name: str, prompt: str) -> str:
     else:
         # Future: add OpenAI or other providers here.
         raise ValueError(f"Unsupported provider: {provider}")
+
+def ask_llm_stream(provider: str, model_name: str, prompt: str) -> Iterator[str]:
+    """Yield the reply in chunks as it is generated.
+
+    interlinked has no streaming call, so non-mock providers yield the full
+    reply as a single chunk; callers are written against the iterator either way.
+    """
+    provider = (provider or "google").lower()
+    if provider == "mock":
+        reply = ask_llm(provider, model_name, prompt)
+        for i in range(0, len(reply), 32):
+            yield reply[i:i + 32]
+        return
+    yield ask_llm(provider, model_name, prompt)
+
+# --- reply cache: in-process LRU in front of one JSON file per sha256(provider, model, prompt) ---
+_MEMORY_SIZE = 512
+_memory: "OrderedDict[str, str]" = OrderedDict()
+
+def _cache_key(provider: str, model_name: str, prompt: str) -> str:
+    return hashlib.sha256(f"{provider}\0{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+def _remember(key: str, reply: str):
+    _memory[key] = reply
+    _memory.move_to_end(key)
+    if len(_memory) > _MEMORY_SIZE:
+        _memory.popitem(last=False)
+
+def cached_reply(cache_dir: str, provider: str, model_name: str, prompt: str) -> Optional[str]:
+    key = _cache_key(provider, model_name, prompt)
+    reply = _memory.get(key)
+    if reply is not None:
+        _memory.move_to_end(key)
+        return reply
+    try:
+        with open(os.path.join(cache_dir, f"{key}.json"), "r") as f:
+            reply = json.load(f)["reply"]
+    except (OSError, ValueError, KeyError):
+        return None
+    _remember(key, reply)
+    return reply
+
+def store_reply(cache_dir: str, provider: str, model_name: str, prompt: str, reply: str):
+    key = _cache_key(provider, model_name, prompt)
+    _remember(key, reply)
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"reply": reply, "ts": time.time()}, f)
+    os.replace(tmp, path)
+
+def ask_llm_cached(provider: str, model_name: str, prompt: str, cache_dir: str = ".llm_cache") -> str:
+    """ask_llm, but identical (provider, model, prompt) triples are answered from memory or disk."""
+    reply = cached_reply(cache_dir, provider, model_name, prompt)
+    if reply is None:
+        reply = ask_llm(provider, model_name, prompt)
+        store_reply(cache_dir, provider, model_name, prompt, reply)
+    return reply
+
+def ask_llm_stream_cached(provider: str, model_name: str, prompt: str, cache_dir: str = ".llm_cache") -> Iterator[str]:
+    """Streaming twin of ask_llm_cached; a hit is yielded in one chunk."""
+    reply = cached_reply(cache_dir, provider, model_name, prompt)
+    if reply is not None:
+        yield reply
+        return
+    buf = []
+    for chunk in ask_llm_stream(provider, model_name, prompt):
+        buf.append(chunk)
+        yield chunk
+    store_reply(cache_dir, provider, model_name, prompt, "".join(buf))
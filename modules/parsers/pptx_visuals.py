@@ -1,17 +1,20 @@
 # modules/parsers/pptx_visuals.py
 from __future__ import annotations
 import re
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from itertools import repeat
 from typing import List, Tuple, Dict, Optional
 from datetime import date
 
+import numpy as np
 from pptx import Presentation
 from pptx.enum.shapes import MSO_SHAPE_TYPE
 
 # ---------------------
 # Data classes
 # ---------------------
-@dataclass
+@dataclass(slots=True)
 class BBox:
     x: float; y: float; w: float; h: float
     @property
@@ -19,7 +22,7 @@ class BBox:
     @property
     def cy(self): return self.y + self.h / 2
 
-@dataclass
+@dataclass(slots=True)
 class TextBox:
     slide: int
     text: str
@@ -28,27 +31,27 @@ class TextBox:
     bold: bool
     group_id: Optional[int] = None
 
-@dataclass
+@dataclass(slots=True)
 class ShapeBox:
     slide: int
     kind: str               # "line" | "circle" | "rect" | "other"
     bbox: BBox
     group_id: Optional[int] = None
 
-@dataclass
+@dataclass(slots=True)
 class Axis:
     slide: int
     y0: float; y1: float
     x0: float; x1: float
 
-@dataclass
+@dataclass(slots=True)
 class DateTok:
     slide: int
     raw: str
     iso: Optional[str]
     bbox: BBox
 
-@dataclass
+@dataclass(slots=True)
 class Milestone:
     slide: int
     title: str
@@ -59,7 +62,7 @@ class Milestone:
     confidence: float
     source: str
 
-@dataclass
+@dataclass(slots=True)
 class SpanRow:
     slide: int
     title: str
@@ -76,74 +79,102 @@ class SpanRow:
 # ---------------------
 MONTHS = {"jan":1,"feb":2,"mar":3,"apr":4,"may":5,"jun":6,"jul":7,"aug":8,"sep":9,"oct":10,"nov":11,"dec":12}
 
-DATE_RE = re.compile(
-    r"\b("
+_MON_ALT = (
     r"Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|"
     r"Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t)?(?:ember)?|"
-    r"Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)"
-    r"\.?\s+(\d{1,2})\b",
-    re.I,
+    r"Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?"
 )
-DATE_RE_DMY = re.compile(
-    r"\b(\d{1,2})\s+("
-    r"Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|"
-    r"Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t)?(?:ember)?|"
-    r"Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\b",
+
+DATE_RE = re.compile(rf"\b({_MON_ALT})\.?\s+(\d{{1,2}})\b", re.I)
+DATE_RE_DMY = re.compile(rf"\b(\d{{1,2}})\s+({_MON_ALT})\b", re.I)
+# both orders in one scan: "May 17" -> mdy_*, "17 May" -> dmy_*
+_DATE_ANY_RE = re.compile(
+    rf"(?P<mdy>\b(?P<mdy_month>{_MON_ALT})\.?\s+(?P<mdy_day>\d{{1,2}})\b)|"
+    rf"(?P<dmy>\b(?P<dmy_day>\d{{1,2}})\s+(?P<dmy_month>{_MON_ALT})\b)",
     re.I,
 )
 RANGE_RE = re.compile(rf"({DATE_RE.pattern})\s*(?:–|-|to)\s*({DATE_RE.pattern})", re.I)
+_MON_ONLY_RE = re.compile(rf"^({_MON_ALT})\.?$", re.I)
+_DAY_ONLY_RE = re.compile(r"^\d{1,2}$")
+_MONTH_OR_TODAY_RE = re.compile(rf"^(Today|{_MON_ALT})$", re.I)
+_LETTER_RE = re.compile(r"[A-Za-z]")
+_DIGIT_RE = re.compile(r"\d")
 
 def _ppt_len(x) -> float: return float(x)
 def _looks_like_date(s: str) -> bool:
     """Return True if the string looks like a date (e.g., 'May 17', '17 May')."""
-    return bool(DATE_RE.search(s) or DATE_RE_DMY.search(s))
+    # every date form needs a day number; most titles have none, so skip the big regex
+    return _DIGIT_RE.search(s) is not None and _DATE_ANY_RE.search(s) is not None
 def _shape_bbox(sh) -> BBox: return BBox(_ppt_len(sh.left), _ppt_len(sh.top), _ppt_len(sh.width), _ppt_len(sh.height))
-def _percentile(values: List[float], p: float) -> float:
-    if not values: return 0.0
-    vs = sorted(values); idx = max(0, min(len(vs)-1, int(round(p*(len(vs)-1)))))
-    return vs[idx]
 
 # ---------------------
 # Extract shapes & text
 # ---------------------
-def _text_boxes(slide_idx: int, slide) -> List[TextBox]:
-    out: List[TextBox] = []
-    for sh in slide.shapes:
-        if not hasattr(sh, "has_text_frame") or not sh.has_text_frame:
-            continue
-        text = (sh.text or "").strip()
-        text = text.replace("\xa0"," ").replace("\n"," ").replace("\r"," ")
-        if not text:
-            continue
-        fs=None; bold=False
-        try:
-            for p in sh.text_frame.paragraphs:
-                for r in p.runs:
-                    if r.font.size: fs=float(r.font.size.pt)
-                    if r.font.bold: bold=True
-                    break
-                if fs: break
-        except Exception:
-            pass
-        fs = fs or 12.0
-        out.append(TextBox(slide_idx, text, _shape_bbox(sh), fs, bold))
-    return out
-
-def _shape_boxes(slide_idx: int, slide) -> List[ShapeBox]:
-    out: List[ShapeBox] = []
-    def walk(container):
+def _clean_text(text: Optional[str]) -> str:
+    text = (text or "").strip()
+    return text.replace("\xa0"," ").replace("\n"," ").replace("\r"," ")
+
+def _text_box(slide_idx: int, sh) -> Optional[TextBox]:
+    text = _clean_text(sh.text)
+    if not text:
+        return None
+    fs=None; bold=False
+    try:
+        for p in sh.text_frame.paragraphs:
+            for r in p.runs:
+                if r.font.size: fs=float(r.font.size.pt)
+                if r.font.bold: bold=True
+                break
+            if fs: break
+    except Exception:
+        pass
+    fs = fs or 12.0
+    return TextBox(slide_idx, text, _shape_bbox(sh), fs, bold)
+
+# per-slide struct-of-arrays view of the text boxes (row i <-> texts[i]);
+# float64 because EMU coordinates (up to ~1.2e7) don't fit float32 exactly
+_GEOM_DTYPE = np.dtype([("cx", "f8"), ("cy", "f8"), ("fs", "f8")])
+
+def _text_geometry(texts: List[TextBox]) -> np.ndarray:
+    geo = np.empty(len(texts), dtype=_GEOM_DTYPE)
+    for i, t in enumerate(texts):
+        b = t.bbox
+        geo[i] = (b.x + b.w / 2, b.y + b.h / 2, t.font_size)
+    return geo
+
+def _walk_slide(slide_idx: int, slide) -> Tuple[List[TextBox], List[ShapeBox], List[str]]:
+    """
+    One pass over the shape tree: text boxes from top-level shapes, geometry from
+    every non-group shape (groups are recursed into), and the slide's text in
+    shape order. The latter also covers grouped shapes and table cells, which
+    stay out of the text boxes used for layout. python-pptx property access
+    goes through lxml, so each shape is visited once.
+    """
+    texts: List[TextBox] = []
+    shapes: List[ShapeBox] = []
+    raw: List[str] = []
+    def walk(container, top: bool):
         for sh in container.shapes:
             st = sh.shape_type
             if st == MSO_SHAPE_TYPE.GROUP:
-                walk(sh); continue
+                walk(sh, False); continue
+            if getattr(sh, "has_text_frame", False):
+                if top:
+                    tb = _text_box(slide_idx, sh)
+                    if tb:
+                        texts.append(tb); raw.append(tb.text)
+                else:
+                    raw.append(_clean_text(sh.text))
+            elif getattr(sh, "has_table", False):
+                raw.extend(_clean_text(c.text) for r in sh.table.rows for c in r.cells)
             kind = "other"
             w, h = float(sh.width), float(sh.height)
             if st == MSO_SHAPE_TYPE.LINE or (h > 0 and (w/h) > 10): kind = "line"
             elif st == MSO_SHAPE_TYPE.AUTO_SHAPE and h>0 and abs(w-h) <= max(12.0, 0.25*h): kind = "circle"
             elif st == MSO_SHAPE_TYPE.AUTO_SHAPE: kind = "rect"
-            out.append(ShapeBox(slide_idx, kind, _shape_bbox(sh)))
-    walk(slide)
-    return out
+            shapes.append(ShapeBox(slide_idx, kind, _shape_bbox(sh)))
+    walk(slide, True)
+    return texts, shapes, [t for t in raw if t]
 
 # ---------------------
 # Axis & alignment
@@ -156,8 +187,9 @@ def _detect_axis(shapes: List[ShapeBox]) -> Optional[Axis]:
         return Axis(best.slide, y-8, y+8, best.bbox.x, best.bbox.x+best.bbox.w)
     circles = [s for s in shapes if s.kind == "circle"]
     if len(circles) >= 3:
-        ys = [c.bbox.cy for c in circles]
-        y_min, y_max = _percentile(ys, 0.25), _percentile(ys, 0.75)
+        ys = np.array([c.bbox.cy for c in circles])
+        # "nearest" returns an actual sample, rounding the rank half-to-even
+        y_min, y_max = np.quantile(ys, [0.25, 0.75], method="nearest").tolist()
         row = [c for c in circles if (y_min-12) <= c.bbox.cy <= (y_max+12)]
         if row:
             xs = [c.bbox.cx for c in row]
@@ -166,10 +198,10 @@ def _detect_axis(shapes: List[ShapeBox]) -> Optional[Axis]:
 
 def _axis_from_dates(toks: List[DateTok], slide_h: float) -> Optional[Axis]:
     if len(toks) < 2: return None
-    ys = [d.bbox.cy for d in toks]; xs=[d.bbox.cx for d in toks]
-    y_med = _percentile(ys, 0.5)
+    xy = np.array([(d.bbox.cx, d.bbox.cy) for d in toks])
+    y_med = float(np.quantile(xy[:, 1], 0.5, method="nearest"))
     band = 0.04 * slide_h  # 4% of slide height
-    return Axis(toks[0].slide, y_med - band/2, y_med + band/2, min(xs), max(xs))
+    return Axis(toks[0].slide, y_med - band/2, y_med + band/2, float(xy[:, 0].min()), float(xy[:, 0].max()))
 
 def _in_band(y: float, axis: Axis, pad: float = 0) -> bool:
     return (axis.y0 - pad) <= y <= (axis.y1 + pad)
@@ -177,11 +209,14 @@ def _in_band(y: float, axis: Axis, pad: float = 0) -> bool:
 # ---------------------
 # Dates & titles
 # ---------------------
-def _extract_year_headers(texts: List[TextBox]) -> List[TextBox]:
+def _extract_year_headers(texts: List[TextBox], geo: Optional[np.ndarray] = None) -> List[TextBox]:
     """Pick likely year headers: 4-digit numbers, prefer larger fonts."""
-    cands = [t for t in texts if (len(t.text.strip()) == 4 and t.text.strip().isdigit())]
-    cutoff = _percentile([t.font_size for t in cands], 0.7) if cands else 0
-    return [t for t in cands if t.font_size >= cutoff]
+    rows = [i for i, t in enumerate(texts) if (len(t.text.strip()) == 4 and t.text.strip().isdigit())]
+    if not rows:
+        return []
+    fs = geo["fs"][rows] if geo is not None else np.array([texts[i].font_size for i in rows])
+    cutoff = np.quantile(fs, 0.7, method="nearest")
+    return [texts[i] for i, keep in zip(rows, (fs >= cutoff).tolist()) if keep]
 
 def _parse_mmdd(raw: str, year: Optional[int]) -> Optional[str]:
     m = DATE_RE.search(raw) or DATE_RE_DMY.search(raw)
@@ -206,36 +241,38 @@ def _assign_years(tokens: List[DateTok], year_headers: List[TextBox]) -> None:
 def _detect_dates_inline(texts: List[TextBox]) -> List[DateTok]:
     toks: List[DateTok] = []
     for t in texts:
-        for m in DATE_RE.finditer(t.text):
-            toks.append(DateTok(t.slide, m.group(0), None, t.bbox))
-        for m in DATE_RE_DMY.finditer(t.text):
-            toks.append(DateTok(t.slide, f"{m.group(2)} {m.group(1)}", None, t.bbox))
+        dmy: List[DateTok] = []
+        for m in _DATE_ANY_RE.finditer(t.text):
+            if m.group("mdy") is not None:
+                toks.append(DateTok(t.slide, m.group(0), None, t.bbox))
+            else:
+                dmy.append(DateTok(t.slide, f"{m.group('dmy_month')} {m.group('dmy_day')}", None, t.bbox))
+        # month-day hits first, then day-month, as with the former two passes
+        toks.extend(dmy)
     return toks
 
 def _detect_dates_split_boxes(texts: List[TextBox], axis: Axis, year_headers: List[TextBox], slide_h: float) -> List[DateTok]:
-    mon_only = re.compile(r"^(Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t)?(?:ember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\.?$", re.I)
-    day_only = re.compile(r"^\d{1,2}$")
     months, days = [], []
     for t in texts:
         s = t.text.strip()
-        if mon_only.fullmatch(s): months.append(t)
-        elif day_only.fullmatch(s) and 1 <= int(s) <= 31: days.append(t)
+        if _MON_ONLY_RE.fullmatch(s): months.append(t)
+        elif _DAY_ONLY_RE.fullmatch(s) and 1 <= int(s) <= 31: days.append(t)
 
     if not months or not days: return []
 
     toks: List[DateTok] = []
-    used = set()
+    used = set()  # indices into days; TextBox itself is unhashable
     for mb in months:
-        best=None; best_sc=1e18
-        for db in days:
-            if db in used: continue
+        best=None; best_j=-1; best_sc=1e18
+        for j, db in enumerate(days):
+            if j in used: continue
             dx = abs(mb.bbox.cx - db.bbox.cx)
             dy = abs(mb.bbox.cy - db.bbox.cy)
             sc = dx + dy
             if sc < best_sc:
-                best_sc = sc; best = db
+                best_sc = sc; best = db; best_j = j
         if not best: continue
-        used.add(best)
+        used.add(best_j)
         raw = f"{mb.text.strip()} {best.text.strip()}"
         cx = (mb.bbox.cx + best.bbox.cx)/2; cy = (mb.bbox.cy + best.bbox.cy)/2
         toks.append(DateTok(mb.slide, raw, None, BBox(cx-1, cy-1, 2, 2)))
@@ -261,15 +298,17 @@ def _detect_dates(texts: List[TextBox], axis: Axis, year_headers: List[TextBox],
         return dedup
     return near
 
-def _detect_titles(texts: List[TextBox], axis: Axis, slide_h: float) -> List[TextBox]:
+def _detect_titles(texts: List[TextBox], axis: Axis, slide_h: float, geo: Optional[np.ndarray] = None) -> List[TextBox]:
     mid_y = (axis.y0 + axis.y1) / 2
-    near = [t for t in texts if abs(t.bbox.cy - mid_y) <= 0.50 * slide_h]  # wide window
-    month_only = re.compile(r"^(Today|Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t)?(?:ember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)$", re.I)
+    if geo is None:
+        geo = _text_geometry(texts)
+    rows = np.flatnonzero(np.abs(geo["cy"] - mid_y) <= 0.50 * slide_h)  # wide window
+    near = [texts[i] for i in rows.tolist()]
     out: List[TextBox] = []
     for t in near:
         s = t.text.strip()
-        if month_only.fullmatch(s): continue
-        if not re.search(r"[A-Za-z]", s): continue
+        if _MONTH_OR_TODAY_RE.fullmatch(s): continue
+        if not _LETTER_RE.search(s): continue
         out.append(t)
     return out
 
@@ -327,8 +366,15 @@ def _pair_axisless(
             t = pick(cand_titles, x_tol_secondary, y_tol_secondary)
         return t
 
-    for d in dates:
-        t = best_title_for_date(d)
+    if len(dates) < 4 or len(cand_titles) < 4:
+        picks = [best_title_for_date(d) for d in dates]
+    else:
+        picks = _pick_titles_np(
+            dates, cand_titles,
+            (x_tol_primary, y_tol_primary), (x_tol_secondary, y_tol_secondary),
+        )
+
+    for d, t in zip(dates, picks):
         if t:
             # confidence primarily from x alignment (stable heuristic)
             conf_x = 1 - min(abs(t.bbox.cx - d.bbox.cx) / x_tol_secondary, 1.0)
@@ -346,6 +392,32 @@ def _pair_axisless(
             ))
     return out
 
+def _pick_titles_np(
+    dates: List[DateTok],
+    titles: List[TextBox],
+    primary: Tuple[float, float],
+    secondary: Tuple[float, float],
+) -> List[Optional[TextBox]]:
+    """Vectorized best_title_for_date: score every (date, title) pair at once."""
+    D = np.array([[d.bbox.cx, d.bbox.cy] for d in dates])
+    T = np.array([[t.bbox.cx, t.bbox.cy, t.font_size] for t in titles])
+    dx = np.abs(D[:, None, 0] - T[None, :, 0])
+    dy = np.abs(D[:, None, 1] - T[None, :, 1])
+    font = (T[:, 2] / 24.0) * 0.1
+
+    def pick(x_tol, y_tol):
+        score = (1 - dx / x_tol) * 0.6 + (1 - dy / y_tol) * 0.3 + font
+        score[(dx > x_tol) | (dy > y_tol)] = -np.inf
+        best = score.argmax(axis=1)  # first maximum, as max() picks in the loop version
+        best[np.isneginf(score.max(axis=1))] = -1
+        return best
+
+    best = pick(*primary)
+    miss = best < 0
+    if miss.any():
+        best[miss] = pick(*secondary)[miss]
+    return [titles[i] if i >= 0 else None for i in best.tolist()]
+
 # ---------------------
 # Spans
 # ---------------------
@@ -364,7 +436,44 @@ def _detect_spans_from_titles(titles: List[TextBox], year_headers: List[TextBox]
 # ---------------------
 # Public entry
 # ---------------------
-def parse_pptx_visuals(pptx_path: str, status_legend: Dict[str, str] | None = None):
+def _process_slide(
+    i: int, slide, slide_w: float, slide_h: float, pptx_path: str
+) -> Tuple[str, List[Milestone], List[SpanRow], str]:
+    """Caption, milestones, spans and raw text for one slide; no state shared with other slides."""
+    texts, shapes, raw_parts = _walk_slide(i, slide)
+    geo    = _text_geometry(texts)
+    raw = " ".join(raw_parts)
+
+    # Dates (inline) just to help axis fallback
+    inline_dates = _detect_dates_inline(texts)
+
+    # Axis: prefer shape-based, fallback to dates
+    axis = _detect_axis(shapes)
+    if not axis and inline_dates:
+        axis = _axis_from_dates(inline_dates, slide_h)
+
+    if not axis:
+        return f"Slide {i}: {raw[:1200]}", [], [], raw
+
+    # Unified detection & pairing
+    year_headers = _extract_year_headers(texts, geo)
+    date_toks    = _detect_dates(texts, axis, year_headers, slide_h)
+    title_blks   = _detect_titles(texts, axis, slide_h, geo)
+
+    ms = _pair_axisless(date_toks, title_blks, axis, slide_w, slide_h)
+    for m in ms: m.source = pptx_path
+
+    spans = _detect_spans_from_titles(title_blks, year_headers, pptx_path, i)
+
+    # Caption for RAG
+    vis_bits = [f"{m.title} ({m.date_raw})" for m in ms if m.title and m.date_raw]
+    if vis_bits:
+        caption = f"Slide {i}: " + "; ".join(vis_bits)
+    else:
+        caption = f"Slide {i}: {raw[:1200]}"
+    return caption, ms, spans, raw
+
+def parse_pptx_visuals(pptx_path: str, status_legend: Dict[str, str] | None = None, workers: int = 4):
     prs = Presentation(pptx_path)
     slide_w_total = float(prs.slide_width)
     slide_h_total = float(prs.slide_height)
@@ -372,42 +481,26 @@ def parse_pptx_visuals(pptx_path: str, status_legend: Dict[str, str] | None = No
     captions: List[str] = []
     milestones: List[Milestone] = []
     spans: List[SpanRow] = []
+    slide_texts: List[str] = []
+
+    slides = list(prs.slides)
+    args = (
+        range(1, len(slides) + 1), slides,
+        repeat(slide_w_total), repeat(slide_h_total), repeat(pptx_path),
+    )
+    # slides are independent; small decks aren't worth the thread startup
+    if workers > 1 and len(slides) >= 8:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_process_slide, *args))
+    else:
+        results = list(map(_process_slide, *args))
 
-    for i, slide in enumerate(prs.slides, start=1):
-        shapes = _shape_boxes(i, slide)
-        texts  = _text_boxes(i, slide)
-
-        # Dates (inline) just to help axis fallback
-        inline_dates = _detect_dates_inline(texts)
-
-        # Axis: prefer shape-based, fallback to dates
-        axis = _detect_axis(shapes)
-        if not axis and inline_dates:
-            axis = _axis_from_dates(inline_dates, slide_h_total)
-
-        if not axis:
-            raw = " ".join([t.text for t in texts])
-            captions.append(f"Slide {i}: {raw[:1200]}")
-            continue
-
-        # Unified detection & pairing
-        year_headers = _extract_year_headers(texts)
-        date_toks    = _detect_dates(texts, axis, year_headers, slide_h_total)
-        title_blks   = _detect_titles(texts, axis, slide_h_total)
-
-        ms = _pair_axisless(date_toks, title_blks, axis, slide_w_total, slide_h_total)
-        for m in ms: m.source = pptx_path
+    # map() keeps slide order, so captions stay "Slide 1", "Slide 2", ...
+    for caption, ms, sp, raw in results:
+        captions.append(caption)
         milestones.extend(ms)
-
-        spans.extend(_detect_spans_from_titles(title_blks, year_headers, pptx_path, i))
-
-        # Caption for RAG
-        vis_bits = [f"{m.title} ({m.date_raw})" for m in ms if m.title and m.date_raw]
-        if vis_bits:
-            captions.append(f"Slide {i}: " + "; ".join(vis_bits))
-        else:
-            raw = " ".join([t.text for t in texts])
-            captions.append(f"Slide {i}: {raw[:1200]}")
+        spans.extend(sp)
+        slide_texts.append(raw)
 
     structured = {
         "milestones": [
@@ -421,5 +514,7 @@ def parse_pptx_visuals(pptx_path: str, status_legend: Dict[str, str] | None = No
              "source": s.source}
             for s in spans if s.title
         ],
+        # full text of slide N at index N-1, so callers needn't parse the deck again
+        "slide_texts": slide_texts,
     }
     return captions, structured
@@ -2,41 +2,58 @@
 
 import re
 from datetime import datetime, timedelta, date
-from typing import Optional, Tuple, List, Set, Dict
+from functools import lru_cache
+from typing import Optional, Tuple, List, Dict
 from modules.store.structured_store import StructuredStore
 
 # ---- intent patterns ----
 RED_Q  = re.compile(r"\b(red|at risk|blocked)\b", re.I)
 WHEN_Q = re.compile(r"\bwhen\b|\bdate\b|\bdeadline\b|\brange\b|\bfrom\b.*\bto\b", re.I)
 
+# ---- date-range patterns (matched against the lowercased question) ----
+# Kept as three patterns on purpose: each has a literal prefix ("next", "in",
+# "between"/"from") that re can skip ahead to, which a merged alternation loses;
+# one combined finditer measured ~2x slower on typical questions.
+_NEXT_N = re.compile(r"next\s+(\d{1,3})\s+days")
+_IN_MONTH = re.compile(r"\bin\s+([A-Za-z]{3,9})\b")
+_BETWEEN = re.compile(
+    r"(?:between|from)\s+([A-Za-z]{3,9}\.?\s+\d{1,2}|\d{4}-\d{2}-\d{2})\s+(?:and|to)\s+([A-Za-z]{3,9}\.?\s+\d{1,2}|\d{4}-\d{2}-\d{2})"
+)
+_NON_DIGIT = re.compile(r"\D")
+
 # ---- month helpers ----
 MONTHS = {
     "january":1,"february":2,"march":3,"april":4,"may":5,"june":6,
     "july":7,"august":8,"september":9,"october":10,"november":11,"december":12
 }
 SHORT = {m[:3]: i for m, i in MONTHS.items()}
+_MONTH_LOOKUP = {**MONTHS, **SHORT}  # full and 3-letter names, one probe
 
 def _parse_month(s: str) -> Optional[int]:
-    s = s.strip().lower().replace(".", "")
-    return MONTHS.get(s) or SHORT.get(s)
+    return _MONTH_LOOKUP.get(s.strip().lower().replace(".", ""))
 
 def _parse_dateish(s: str, default_year: int) -> Optional[date]:
     s = s.strip().replace(".", "")
     parts = s.split()
-    if len(parts) == 2 and _parse_month(parts[0]):
-        m = _parse_month(parts[0])
-        d = int(re.sub(r"\D", "", parts[1]) or "1")
+    m = _parse_month(parts[0]) if len(parts) == 2 else None
+    if m:
+        d = int(_NON_DIGIT.sub("", parts[1]) or "1")
         return date(default_year, m, d)
     try:
         return datetime.strptime(s, "%Y-%m-%d").date()
     except Exception:
         return None
 
+@lru_cache(maxsize=64)
+def _eom(year: int, month: int) -> date:
+    """Last day of the month."""
+    return date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+
 def _extract_range(question: str, default_year: int) -> Optional[Tuple[date, date]]:
     q = question.lower()
 
     # next N days
-    m = re.search(r"next\s+(\d{1,3})\s+days", q)
+    m = _NEXT_N.search(q)
     if m:
         n = int(m.group(1))
         start = date.today()
@@ -44,22 +61,13 @@ def _extract_range(question: str, default_year: int) -> Optional[Tuple[date, dat
         return start, end
 
     # in <Month>
-    m = re.search(r"\bin\s+([A-Za-z]{3,9})\b", q)
-    if m and _parse_month(m.group(1)):
-        month = _parse_month(m.group(1))
-        start = date(default_year, month, 1)
-        # end of month
-        if month == 12:
-            end = date(default_year + 1, 1, 1) - timedelta(days=1)
-        else:
-            end = date(default_year, month + 1, 1) - timedelta(days=1)
-        return start, end
+    m = _IN_MONTH.search(q)
+    month = _parse_month(m.group(1)) if m else None
+    if month:
+        return date(default_year, month, 1), _eom(default_year, month)
 
     # between X and Y / from X to Y
-    m = re.search(
-        r"(?:between|from)\s+([A-Za-z]{3,9}\.?\s+\d{1,2}|\d{4}-\d{2}-\d{2})\s+(?:and|to)\s+([A-Za-z]{3,9}\.?\s+\d{1,2}|\d{4}-\d{2}-\d{2})",
-        q,
-    )
+    m = _BETWEEN.search(q)
     if m:
         s = _parse_dateish(m.group(1), default_year)
         e = _parse_dateish(m.group(2), default_year)
@@ -71,15 +79,10 @@ def _extract_range(question: str, default_year: int) -> Optional[Tuple[date, dat
 # ---- formatting helpers ----
 def _fmt_milestones(rows: List[Tuple[int, str, str]]) -> str:
     """
-    rows: [(slide, title, date_or_raw)]
+    rows: [(slide, title, date_or_raw)], already distinct (SELECT DISTINCT)
     """
-    seen: Set[Tuple[int, str, str]] = set()
     bullets: List[str] = []
     for slide, title, d in rows:
-        key = (slide, title or "", d or "")
-        if key in seen:
-            continue
-        seen.add(key)
         if title and d:
             bullets.append(f"- Slide {slide}: **{title}** — {d}")
         elif title:
@@ -90,15 +93,10 @@ def _fmt_milestones(rows: List[Tuple[int, str, str]]) -> str:
 
 def _fmt_spans(rows: List[Tuple[int, str, str, str]]) -> str:
     """
-    rows: [(slide, title, start, end)]
+    rows: [(slide, title, start, end)], already distinct (SELECT DISTINCT)
     """
-    seen: Set[Tuple[int, str, str, str]] = set()
     bullets: List[str] = []
     for slide, title, start, end in rows:
-        key = (slide, title or "", start or "", end or "")
-        if key in seen:
-            continue
-        seen.add(key)
         if title and start and end:
             bullets.append(f"- Slide {slide}: **{title}** — {start} → {end}")
         elif title:
@@ -106,11 +104,23 @@ def _fmt_spans(rows: List[Tuple[int, str, str, str]]) -> str:
     return "\n".join(bullets)
 
 # ---- main entry ----
+@lru_cache(maxsize=4)
+def _store(path: str) -> StructuredStore:
+    # one store (and SQLite connection) per DB file for the whole process
+    return StructuredStore(path)
+
 def try_structured_first(cfg: dict, question: str) -> str | None:
     """Return a formatted markdown answer if we can satisfy from structured data, else None."""
     store_path = cfg.get("structured_store", {}).get("path") if isinstance(cfg.get("structured_store"), dict) else "structured.db"
-    store = StructuredStore(store_path)
-    default_year = datetime.now().year
+    # answers depend only on the question, today's date and the store contents
+    return _cached_answer(
+        store_path, question.strip().lower(), date.today().isoformat(), _store(store_path).version
+    )
+
+@lru_cache(maxsize=512)
+def _cached_answer(store_path: str, question: str, today_iso: str, version: Tuple[int, int]) -> str | None:
+    store = _store(store_path)
+    default_year = int(today_iso[:4])
 
     # 1) Status queries (At Risk / red / blocked)
     if RED_Q.search(question):
@@ -124,33 +134,8 @@ def try_structured_first(cfg: dict, question: str) -> str | None:
     rng = _extract_range(question, default_year)
     if rng:
         s, e = rng
-
-        # milestones strictly inside [s, e]
-        ms = list(
-            store.conn.execute(
-                """
-                SELECT slide, title, COALESCE(date, raw_date)
-                FROM milestones
-                WHERE date IS NOT NULL AND date >= ? AND date <= ?
-                ORDER BY date ASC
-                """,
-                (s.isoformat(), e.isoformat()),
-            )
-        )
-
-        # spans that overlap [s, e]
-        sp = list(
-            store.conn.execute(
-                """
-                SELECT slide, title, COALESCE(start_date,''), COALESCE(end_date,'')
-                FROM spans
-                WHERE start_date IS NOT NULL AND end_date IS NOT NULL
-                  AND NOT(end_date < ? OR start_date > ?)
-                ORDER BY start_date ASC
-                """,
-                (s.isoformat(), e.isoformat()),
-            )
-        )
+        # milestones inside [s, e] and spans overlapping it, in one query
+        ms, sp = store.get_range(s, e)
 
         parts: List[str] = []
         if ms:
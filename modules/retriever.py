@@ -1,23 +1,159 @@
-from typing import List
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
 from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+from modules.cache.proximity import ProximityCache
+
+class QueryCache:
+    """Thread-safe LRU of exact (query, k) -> documents, with entries expiring after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, List[Document]]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable) -> Optional[List[Document]]:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            ts, docs = hit
+            if time.monotonic() - ts > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return list(docs)
+
+    def put(self, key: Hashable, docs: List[Document]):
+        with self._lock:
+            self._data[key] = (time.monotonic(), list(docs))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._data.clear()
 
 class Retriever:
     def __init__(self, cfg, db):
         self.cfg = cfg
+        # exact repeats skip embedding + ANN entirely; query_cache_size: 0 disables
+        size = int(cfg.get("query_cache_size", 256))
+        self.query_cache = QueryCache(size, float(cfg.get("query_cache_ttl", 300))) if size > 0 else None
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0}
+        # semantic cache: near-duplicate questions reuse the last hit's documents
+        prox = cfg.get("proximity_cache") or {}
+        self.proximity = (
+            ProximityCache(capacity=int(prox.get("capacity", 128)), tau=float(prox.get("tau", 0.95)))
+            if prox.get("enabled", False) else None
+        )
         self.db = db
 
+    @property
+    def db(self):
+        return self._db
+
+    @db.setter
+    def db(self, db):
+        # a re-index swaps in a new store; cached results belong to the old one
+        self._db = db
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop every cached result (call after the index changes)."""
+        if self.query_cache is not None:
+            self.query_cache.invalidate()
+        if self.proximity is not None:
+            self.proximity.clear()
+
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        emb = self.db.embedding_function
+        if not isinstance(emb, Embeddings):
+            return [emb(q) for q in queries]
+        if len(queries) == 1:
+            return [emb.embed_query(queries[0])]
+        # one forward pass for the lot (our sentence-transformer embedders
+        # treat queries and documents the same way)
+        return emb.embed_documents(queries)
+
+    def embed_query(self, query: str) -> List[float]:
+        """The query vector search() would use; pass it to search_with_embedding()."""
+        return self._embed_queries([query])[0]
+
     def search(self, query: str) -> List[Document]:
+        return self.batch_search([query])[0]
+
+    def search_with_embedding(self, query: str, embedding: Sequence[float]) -> List[Document]:
+        """search() for a caller that already embedded `query` (skips the embedding pass)."""
+        return self.batch_search([query], [embedding])[0]
+
+    def batch_search(
+        self, queries: List[str], embeddings: Optional[List[Sequence[float]]] = None
+    ) -> List[List[Document]]:
+        """
+        Documents for each query, in order. Duplicates are searched once, cache
+        misses are embedded in a single call (unless `embeddings`, parallel to
+        `queries`, are given) and looked up in parallel.
+        """
         if self.db is None:
-            return []
+            return [[] for _ in queries]
+        k = int(self.cfg.get("k", 3))
+        given = dict(zip(queries, embeddings)) if embeddings is not None else None
+        found: Dict[str, List[Document]] = {}
+        todo: List[str] = []
+        for q in dict.fromkeys(queries):
+            docs = self.query_cache.get((q, k)) if self.query_cache is not None else None
+            if docs is not None:
+                self.stats["hits"] += 1
+                found[q] = docs
+            else:
+                self.stats["misses"] += 1
+                todo.append(q)
+
+        if todo:
+            vecs = [given[q] for q in todo] if given is not None else self._embed_queries(todo)
+            misses = []
+            for q, vec in zip(todo, vecs):
+                docs = self.proximity.get(vec) if self.proximity is not None else None
+                if docs is not None:
+                    found[q] = docs
+                else:
+                    misses.append((q, vec))
+
+            def run(item):
+                vec = item[1]
+                return self._search(lambda n: self.db.similarity_search_by_vector(vec, k=n))
+
+            threads = min(int(self.cfg.get("search_threads", 4)), len(misses))
+            if threads > 1:
+                with ThreadPoolExecutor(max_workers=threads) as ex:
+                    results = list(ex.map(run, misses))
+            else:
+                results = [run(item) for item in misses]
+            for (q, vec), docs in zip(misses, results):
+                found[q] = docs
+                if self.proximity is not None:
+                    self.proximity.put(vec, docs)
+            if self.query_cache is not None:
+                for q in todo:
+                    self.query_cache.put((q, k), found[q])
+
+        return [list(found[q]) for q in queries]
+
+    def _search(self, run: Callable[[int], List[Document]]) -> List[Document]:
         k = int(self.cfg.get("k", 3))
         adaptive = bool(self.cfg.get("adaptive_topk", False))
         max_k = int(self.cfg.get("adaptive_max_k", 6))
 
-        # Try with k; if too few docs and adaptive enabled, grow.
-        docs = self.db.similarity_search(query, k=k)
-        cur_k = k
-        while adaptive and len(docs) < k and cur_k < max_k:
-            cur_k += 1
-            docs = self.db.similarity_search(query, k=cur_k)
+        # Try with k; if too few docs and adaptive enabled, over-fetch once at max_k
+        # (one more search, instead of one per k+1 ... max_k).
+        docs = run(k)
+        if adaptive and len(docs) < k and max_k > k:
+            docs = run(max_k)
         return docs
-
@@ -1,5 +1,10 @@
+import re
 import sqlite3
-from typing import Iterable, Dict, List, Tuple
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, Callable, Hashable, Iterable, Dict, List, Tuple
 
 DDL = """
 PRAGMA journal_mode=WAL;
@@ -7,36 +12,226 @@ CREATE TABLE IF NOT EXISTS statuses(
   slide INTEGER, area TEXT, status TEXT, color_hex TEXT
 );
 CREATE TABLE IF NOT EXISTS milestones(
-  slide INTEGER, title TEXT, date TEXT, raw_date TEXT
+  slide INTEGER, title TEXT, date TEXT, raw_date TEXT, source TEXT
 );
 CREATE TABLE IF NOT EXISTS spans(
-  slide INTEGER, title TEXT, start_date TEXT, end_date TEXT, raw_range TEXT
+  slide INTEGER, title TEXT, start_date TEXT, end_date TEXT, raw_range TEXT, source TEXT
 );
 """
 
+# Created after _migrate, since the source columns may be added there.
+INDEXES = """
+DROP INDEX IF EXISTS idx_milestones_date;
+DROP INDEX IF EXISTS idx_spans_start;
+DROP INDEX IF EXISTS idx_spans_end;
+CREATE INDEX IF NOT EXISTS idx_statuses_status ON statuses(status);
+CREATE INDEX IF NOT EXISTS idx_milestones_di ON milestones(date_i);
+CREATE INDEX IF NOT EXISTS idx_milestones_source ON milestones(source);
+CREATE INDEX IF NOT EXISTS idx_spans_si ON spans(start_i);
+CREATE INDEX IF NOT EXISTS idx_spans_ei ON spans(end_i);
+CREATE INDEX IF NOT EXISTS idx_spans_source ON spans(source);
+"""
+
+# Full-text indexes over the free-text columns the planner searches, kept in
+# sync by triggers (external content: the text itself lives in the base table).
+FTS_COLUMNS = {"milestones": "title", "spans": "title", "statuses": "area"}
+FTS_DDL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS {t}_fts USING fts5({c}, content='{t}', content_rowid='rowid');
+CREATE TRIGGER IF NOT EXISTS {t}_fts_ai AFTER INSERT ON {t} BEGIN
+  INSERT INTO {t}_fts(rowid, {c}) VALUES (new.rowid, new.{c});
+END;
+CREATE TRIGGER IF NOT EXISTS {t}_fts_ad AFTER DELETE ON {t} BEGIN
+  INSERT INTO {t}_fts({t}_fts, rowid, {c}) VALUES ('delete', old.rowid, old.{c});
+END;
+CREATE TRIGGER IF NOT EXISTS {t}_fts_au AFTER UPDATE OF {c} ON {t} BEGIN
+  INSERT INTO {t}_fts({t}_fts, rowid, {c}) VALUES ('delete', old.rowid, old.{c});
+  INSERT INTO {t}_fts(rowid, {c}) VALUES (new.rowid, new.{c});
+END;
+"""
+_WORD_RE = re.compile(r"\w+")
+
+def _fts_query(text: str) -> str:
+    """All words of `text` (quoted, so no FTS syntax leaks in); the last one as a prefix."""
+    words = _WORD_RE.findall(text)
+    return " ".join(f'"{w}"' for w in words) + "*" if words else ""
+
+# Hot planner queries, shared with query_plans().
+RED_AREAS_SQL = "SELECT slide, area FROM statuses WHERE status='At Risk'"
+RANGE_SQL = (
+    "SELECT DISTINCT 'm' AS kind, slide, title, COALESCE(date, raw_date), NULL, date_i AS day "
+    "FROM milestones WHERE date_i BETWEEN ? AND ? "
+    "UNION ALL "
+    "SELECT DISTINCT 's', slide, title, COALESCE(start_date, ''), COALESCE(end_date, ''), start_i "
+    "FROM spans WHERE start_i <= ? AND end_i >= ? "
+    "ORDER BY kind, day, slide"
+)
+MILESTONE_TITLE_SQL = "SELECT DISTINCT slide, title, COALESCE(date, raw_date) FROM milestones WHERE {}"
+
+def _text_sql(sql: str, tables: List[str], fts: bool) -> str:
+    """
+    Fill `sql`'s {} placeholders with a filter per table: LIKE alone, or with
+    fts=True an FTS MATCH OR'ed with the LIKE (parameters: match, pattern).
+    """
+    if fts:
+        where = [
+            f"(rowid IN (SELECT rowid FROM {t}_fts WHERE {t}_fts MATCH ?) OR {FTS_COLUMNS[t]} LIKE ?)"
+            for t in tables
+        ]
+    else:
+        where = [f"{FTS_COLUMNS[t]} LIKE ?" for t in tables]
+    return sql.format(*where)
+
+# Columns added after the first schema; older DB files get them via ALTER TABLE.
+COLUMNS = {
+    "milestones": {"raw_date": "TEXT", "source": "TEXT", "date_i": "INTEGER"},
+    "spans": {"raw_range": "TEXT", "source": "TEXT", "start_i": "INTEGER", "end_i": "INTEGER"},
+}
+
+# Integer copies of the ISO date columns (proleptic ordinal, = date.toordinal()),
+# so range predicates compare and index plain integers.
+DAY_COLUMNS = {
+    "milestones": {"date_i": "date"},
+    "spans": {"start_i": "start_date", "end_i": "end_date"},
+}
+
+# The range query used to compare the text columns, where an empty start_date
+# sorts before every ISO date: such a span is open-started, so it gets day 0.
+# NULL and empty end dates (and NULL starts) stay NULL and never match a range.
+EMPTY_DAY = {"start_i": 0}
+
+def _ordinal_sql(expr: str, empty: Any = None) -> str:
+    day = f"CAST(julianday({expr}) - 1721424.5 AS INTEGER)"
+    return day if empty is None else f"CASE WHEN {expr} = '' THEN {empty} ELSE {day} END"
+
 class StructuredStore:
     def __init__(self, path: str):
         self.path = path
-        # initialize schema on a fresh connection
-        with self._connect() as conn:
-            conn.executescript(DDL)
+        self._batch_depth = 0
+        self._writes = 0
+        # read results, valid while `version` is unchanged
+        self._reads: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._reads_version = None
+        # one long-lived connection, reused by every call below; Gradio calls
+        # in from worker threads, so every use of it holds this lock (a batch()
+        # holds it until its commit)
+        self._lock = threading.RLock()
+        self.conn = self._connect()
+        self.conn.executescript(DDL)
+        self._migrate(self.conn)
+        self.conn.executescript(INDEXES)
+        self._fts = self._create_fts(self.conn)
 
     def _connect(self) -> sqlite3.Connection:
-        # New connection per call; safe across threads
         conn = sqlite3.connect(self.path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")   # WAL makes this crash-safe
+        conn.execute("PRAGMA busy_timeout=5000")    # indexer and chat share the file
+        conn.execute("PRAGMA cache_size=-20000")    # ~20MB page cache
+        conn.execute("PRAGMA temp_store=MEMORY")
         return conn
 
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        for table, cols in COLUMNS.items():
+            have = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for col, typ in cols.items():
+                if col not in have:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {typ}")
+                    src = DAY_COLUMNS.get(table, {}).get(col)
+                    if src:  # backfill rows written before the column existed
+                        conn.execute(f"UPDATE {table} SET {col} = {_ordinal_sql(src, EMPTY_DAY.get(col))}")
+        # older files backfilled empty starts as NULL
+        conn.execute(f"UPDATE spans SET start_i = {EMPTY_DAY['start_i']} WHERE start_date = '' AND start_i IS NULL")
+        conn.commit()
+
+    @staticmethod
+    def _create_fts(conn: sqlite3.Connection) -> bool:
+        """FTS5 tables + triggers; False if this SQLite build lacks FTS5 (LIKE is used then)."""
+        try:
+            for table, col in FTS_COLUMNS.items():
+                existed = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = ?", (f"{table}_fts",)
+                ).fetchone()
+                conn.executescript(FTS_DDL.format(t=table, c=col))
+                if not existed:  # index rows written before the FTS table existed
+                    conn.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+            conn.commit()
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def _search_text(self, sql: str, tables: List[str], text: str, tail: Tuple = ()) -> List[tuple]:
+        """
+        Run `sql`, whose {} placeholders (one per table) become a filter on that
+        table's FTS column. Rows match on LIKE '%text%' as before, or on the
+        full-text match, which adds reordered and separated words ("beta
+        launch" finds "Launch of the beta"); substrings such as "Prelaunch"
+        for "launch" and punctuation ("C++") are left to the LIKE.
+        """
+        match = _fts_query(text) if self._fts else ""
+        like = f"%{text}%"
+        with self._lock:
+            if match:
+                return self.conn.execute(_text_sql(sql, tables, fts=True), (match, like) * len(tables) + tail).fetchall()
+            return self.conn.execute(_text_sql(sql, tables, fts=False), (like,) * len(tables) + tail).fetchall()
+
+    @contextmanager
+    def batch(self):
+        """Group several add_*/delete_* calls into one transaction (one commit)."""
+        with self._lock:
+            if self._batch_depth:
+                self._batch_depth += 1
+                try:
+                    yield self
+                finally:
+                    self._batch_depth -= 1
+                return
+            self._batch_depth = 1
+            try:
+                with self.conn:
+                    yield self
+            finally:
+                self._batch_depth = 0
+
+    @property
+    def version(self) -> Tuple[int, int]:
+        """Changes whenever the data may have: our own writes, or commits by other connections."""
+        with self._lock:
+            return self._writes, self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _cached(self, key: Hashable, query: Callable[[], Any]) -> Any:
+        with self._lock:
+            version = self.version
+            if version != self._reads_version:
+                self._reads.clear()
+                self._reads_version = version
+            if key in self._reads:
+                self._reads.move_to_end(key)
+                return self._reads[key]
+            result = self._reads[key] = query()
+            if len(self._reads) > 128:
+                self._reads.popitem(last=False)
+            return result
+
+    @contextmanager
+    def _tx(self):
+        # writers commit on their own unless an enclosing batch() will
+        with self._lock:
+            self._writes += 1
+            if self._batch_depth:
+                yield
+            else:
+                with self.conn:
+                    yield
+
     # -------- Upserts (append style, hackathon-safe) --------
     def add_statuses(self, rows: Iterable[Dict]):
         rows = list(rows)
         if not rows: return
-        with self._connect() as conn:
-            conn.executemany(
+        with self._tx():
+            self.conn.executemany(
                 "INSERT INTO statuses VALUES (:slide,:area,:status,:color_hex)",
                 rows,
             )
-            conn.commit()
 
     def add_milestones(self, rows: Iterable[Dict]):
         rows = list(rows)
@@ -48,15 +243,16 @@ class StructuredStore:
                 "title": r.get("title"),
                 "date": r.get("date"),
                 "raw_date": r.get("raw_date"),
+                "source": r.get("source"),
             }
             for r in rows
         ]
-        with self._connect() as conn:
-            conn.executemany(
-                "INSERT INTO milestones VALUES (:slide,:title,:date,:raw_date)",
+        with self._tx():
+            self.conn.executemany(
+                "INSERT INTO milestones(slide,title,date,raw_date,source,date_i) "
+                f"VALUES (:slide,:title,:date,:raw_date,:source,{_ordinal_sql(':date')})",
                 norm,
             )
-            conn.commit()
 
     def add_spans(self, rows: Iterable[Dict]):
         rows = list(rows)
@@ -69,52 +265,163 @@ class StructuredStore:
                 "end_date": r.get("end_date"),
                 "raw_range": r.get("raw_range")
                            or f"{r.get('raw_left','')}-{r.get('raw_right','')}".strip("-"),
+                "source": r.get("source"),
             }
             for r in rows
         ]
-        with self._connect() as conn:
-            conn.executemany(
-                "INSERT INTO spans VALUES (:slide,:title,:start_date,:end_date,:raw_range)",
+        with self._tx():
+            self.conn.executemany(
+                "INSERT INTO spans(slide,title,start_date,end_date,raw_range,source,start_i,end_i) "
+                "VALUES (:slide,:title,:start_date,:end_date,:raw_range,:source,"
+                f"{_ordinal_sql(':start_date', EMPTY_DAY['start_i'])},{_ordinal_sql(':end_date')})",
                 norm,
             )
-            conn.commit()
+
+    def bulk_load(
+        self,
+        statuses: Iterable[Dict] = (),
+        milestones: Iterable[Dict] = (),
+        spans: Iterable[Dict] = (),
+        replace: bool = False,
+    ):
+        """
+        Insert parser output for all three tables in one transaction; with
+        replace=True the existing rows are deleted in that same transaction, so
+        other connections see either the old rows or the new ones. Outside
+        a batch(), fsync is switched off for the load (the index can always be
+        rebuilt from the source files) and restored afterwards.
+        """
+        def load():
+            if replace:
+                self.reset()
+            self.add_statuses(statuses)
+            self.add_milestones(milestones)
+            self.add_spans(spans)
+
+        with self._lock:
+            if self._batch_depth:
+                load()
+                return
+            self.conn.execute("PRAGMA synchronous=OFF")
+            try:
+                with self.batch():
+                    load()
+            finally:
+                self.conn.execute("PRAGMA synchronous=NORMAL")
 
     # -------- Queries used by the planner --------
     def red_areas(self) -> List[Tuple[int, str]]:
-        with self._connect() as conn:
-            cur = conn.execute("SELECT slide, area FROM statuses WHERE status='At Risk'")
-            return [(row["slide"], row["area"]) for row in cur.fetchall()]
+        return list(self._cached("red_areas", self._red_areas))
+
+    def _red_areas(self) -> List[Tuple[int, str]]:
+        with self._lock:
+            return self.conn.execute(RED_AREAS_SQL).fetchall()
 
     def status_by_area_like(self, area_q: str) -> List[Tuple[int, str, str]]:
-        with self._connect() as conn:
-            cur = conn.execute(
-                "SELECT slide, area, status FROM statuses WHERE area LIKE ?",
-                (f"%{area_q}%",),
-            )
-            return [(row["slide"], row["area"], row["status"]) for row in cur.fetchall()]
+        return self._search_text("SELECT slide, area, status FROM statuses WHERE {}", ["statuses"], area_q)
 
     def get_milestone(self, title_q: str) -> List[Tuple[int, str, str]]:
-        with self._connect() as conn:
-            cur = conn.execute(
-                "SELECT slide, title, COALESCE(date, raw_date) AS when_str "
-                "FROM milestones WHERE title LIKE ?",
-                (f"%{title_q}%",),
-            )
-            return [(row["slide"], row["title"], row["when_str"]) for row in cur.fetchall()]
+        return list(self._cached(("milestone", title_q), lambda: self._get_milestone(title_q)))
+
+    def _get_milestone(self, title_q: str) -> List[Tuple[int, str, str]]:
+        return self._search_text(MILESTONE_TITLE_SQL, ["milestones"], title_q)
 
     def get_span(self, title_q: str) -> List[Tuple[int, str, str, str]]:
-        with self._connect() as conn:
-            cur = conn.execute(
-                "SELECT slide, title, COALESCE(start_date, ''), COALESCE(end_date, '') "
-                "FROM spans WHERE title LIKE ?",
-                (f"%{title_q}%",),
-            )
-            return [(row[0], row[1], row[2], row[3]) for row in cur.fetchall()]
+        return list(self._cached(("span", title_q), lambda: self._get_span(title_q)))
+
+    def _get_span(self, title_q: str) -> List[Tuple[int, str, str, str]]:
+        return self._search_text(
+            "SELECT DISTINCT slide, title, COALESCE(start_date, ''), COALESCE(end_date, '') FROM spans WHERE {}",
+            ["spans"],
+            title_q,
+        )
+
+    def get_milestone_or_span(
+        self, title_q: str, limit: int = 8
+    ) -> Tuple[List[Tuple[int, str, str]], List[Tuple[int, str, str, str]]]:
+        """(milestones, spans) matching a title, fetched in a single query."""
+        ms, sp = self._cached(
+            ("milestone_or_span", title_q, limit), lambda: self._get_milestone_or_span(title_q, limit)
+        )
+        return list(ms), list(sp)
+
+    def _get_milestone_or_span(
+        self, title_q: str, limit: int
+    ) -> Tuple[List[Tuple[int, str, str]], List[Tuple[int, str, str, str]]]:
+        rows = self._search_text(
+            "SELECT 'm' AS kind, slide, title, COALESCE(date, raw_date), NULL, NULL "
+            "FROM milestones WHERE {} "
+            "UNION ALL "
+            "SELECT 's', slide, title, NULL, COALESCE(start_date, ''), COALESCE(end_date, '') "
+            "FROM spans WHERE {} "
+            "ORDER BY kind LIMIT ?",
+            ["milestones", "spans"],
+            title_q,
+            (limit,),
+        )
+        ms, sp = [], []
+        for kind, slide, title, when_str, start, end in rows:
+            if kind == "m":
+                ms.append((slide, title, when_str))
+            else:
+                sp.append((slide, title, start, end))
+        return ms, sp
+
+    def get_range(
+        self, start: date, end: date
+    ) -> Tuple[List[Tuple[int, str, str]], List[Tuple[int, str, str, str]]]:
+        """(milestones dated within [start, end], spans overlapping it), in one query."""
+        s, e = start.toordinal(), end.toordinal()
+        with self._lock:
+            rows = self.conn.execute(RANGE_SQL, (s, e, e, s)).fetchall()
+        ms, sp = [], []
+        for kind, slide, title, a, b, _ in rows:
+            if kind == "m":
+                ms.append((slide, title, a))
+            else:
+                sp.append((slide, title, a, b))
+        return ms, sp
 
     # -------- Maintenance --------
+    def delete_sources(self, sources: Iterable[str]):
+        """Drop milestones/spans parsed from the given files (incremental reindex)."""
+        params = [(s,) for s in sources]
+        if not params: return
+        with self._tx():
+            self.conn.executemany("DELETE FROM milestones WHERE source = ?", params)
+            self.conn.executemany("DELETE FROM spans WHERE source = ?", params)
+
     def reset(self):
-        with self._connect() as conn:
-            conn.executescript(
-                "DELETE FROM milestones; DELETE FROM spans; DELETE FROM statuses;"
+        # plain execute() rather than executescript(), which would commit an
+        # enclosing batch() and expose the emptied tables to other readers
+        with self._tx():
+            for table in ("milestones", "spans", "statuses"):
+                self.conn.execute(f"DELETE FROM {table}")
+
+    def analyze(self):
+        """Refresh planner statistics; run once after a (re)load so the indexes get used."""
+        with self._lock:
+            self.conn.execute("ANALYZE")
+            self.conn.commit()
+
+    def explain(self, sql: str, params: Tuple = ()) -> List[str]:
+        """EXPLAIN QUERY PLAN details for `sql` (debugging aid)."""
+        with self._lock:
+            return [row[3] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+    def query_plans(self) -> Dict[str, List[str]]:
+        """Plans of the planner's hot queries; a SCAN on milestones/spans means a missing index."""
+        plans = {
+            "red_areas": self.explain(RED_AREAS_SQL),
+            "get_range": self.explain(RANGE_SQL, (0, 0, 0, 0)),
+            "get_milestone (LIKE)": self.explain(_text_sql(MILESTONE_TITLE_SQL, ["milestones"], fts=False), ("%x%",)),
+        }
+        if self._fts:
+            plans["get_milestone (FTS + LIKE)"] = self.explain(
+                _text_sql(MILESTONE_TITLE_SQL, ["milestones"], fts=True), ('"x"*', "%x%")
             )
-            conn.commit()
+        return plans
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
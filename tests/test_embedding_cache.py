@@ -0,0 +1,67 @@
+import numpy as np
+
+from modules.embedding_cache import EmbeddingCache
+
+
+class FakeEmbeddings:
+    """Deterministic 4-d vectors; records every text it is asked to embed."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [[float(len(t)), float(sum(map(ord, t)) % 97), 1.0, 0.0] for t in texts]
+
+    def __call__(self, texts):
+        return np.asarray(self.embed_documents(texts), dtype=np.float32)
+
+
+def test_fetch_only_embeds_misses(tmp_path):
+    emb = FakeEmbeddings()
+    cache = EmbeddingCache(str(tmp_path / "emb"), "fake")
+    first = cache.fetch(["a", "bb"], emb)
+    assert emb.calls == ["a", "bb"]
+
+    # pending vectors count as hits before they are flushed
+    again = cache.fetch(["bb", "a"], emb)
+    assert emb.calls == ["a", "bb"]
+    np.testing.assert_array_equal(again, first[[1, 0]])
+
+
+def test_flush_reloads_memory_mapped(tmp_path):
+    emb = FakeEmbeddings()
+    prefix = str(tmp_path / "emb")
+    expected = EmbeddingCache(prefix, "fake").embed(["a", "bb", "ccc"], emb)
+
+    cache = EmbeddingCache(prefix, "fake")
+    assert isinstance(cache.vecs, np.memmap)
+    got = cache.fetch(["ccc", "a", "dddd"], emb)
+    assert emb.calls == ["a", "bb", "ccc", "dddd"]
+    np.testing.assert_array_equal(got[:2], expected[[2, 0]])
+
+    # saving mmap rows together with pending ones rewrites the file it was loaded from
+    cache.flush()
+    reloaded = EmbeddingCache(prefix, "fake")
+    assert len(reloaded.rows) == 4
+    np.testing.assert_array_equal(reloaded.fetch(["a", "dddd"], emb), got[[1, 2]])
+    assert emb.calls == ["a", "bb", "ccc", "dddd"]
+
+
+def test_flush_prune_keeps_only_touched_keys(tmp_path):
+    emb = FakeEmbeddings()
+    prefix = str(tmp_path / "emb")
+    EmbeddingCache(prefix, "fake").embed(["a", "bb", "ccc"], emb)
+
+    cache = EmbeddingCache(prefix, "fake")
+    cache.fetch(["bb", "eeeee"], emb)
+    cache.flush(prune=True)
+
+    reloaded = EmbeddingCache(prefix, "fake")
+    assert set(reloaded.rows) == {reloaded.key("bb"), reloaded.key("eeeee")}
+
+
+def test_other_model_starts_empty(tmp_path):
+    prefix = str(tmp_path / "emb")
+    EmbeddingCache(prefix, "fake").embed(["a"], FakeEmbeddings())
+    assert EmbeddingCache(prefix, "other").rows == {}
@@ -1,2 +1,57 @@
 def test_placeholder():
     assert 1 + 1 == 2
+
+
+def _builder(tmp_path, **cfg):
+    from modules.indexer import IndexBuilder
+
+    cfg = dict(
+        data_dir=str(tmp_path / "data"),
+        index_dir=str(tmp_path / "idx"),
+        embedding_model="m",
+        manifest_path=str(tmp_path / "manifest.json"),
+        structured_db_path=str(tmp_path / "s.sqlite"),
+        **cfg,
+    )
+    return IndexBuilder(cfg)
+
+
+def test_embedding_cache_key_includes_dtype(tmp_path):
+    import numpy as np
+
+    fp32 = _builder(tmp_path)._embedding_cache()
+    fp32.embed(["chunk"], lambda texts: np.ones((len(texts), 4), dtype=np.float32))
+    assert fp32.rows
+
+    # vectors computed with other weights' dtype must not be reused
+    assert _builder(tmp_path, embedding_dtype="bfloat16")._embedding_cache().rows == {}
+    assert _builder(tmp_path, embedding_dtype="float32")._embedding_cache().rows == fp32.rows
+
+
+def test_funnel_rows_match_pandas(tmp_path):
+    from datetime import datetime
+
+    import numpy as np
+    import pandas as pd
+    from openpyxl import Workbook
+
+    from modules.indexer import _funnel_rows
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["", "", datetime(2025, 1, 1), datetime(2025, 1, 8), datetime(2025, 1, 15)])
+    ws.append(["Funnel", " weekly "])
+    ws.append([])
+    ws.append(["Platform", "Step", "Users", "Users", "Users"])
+    ws.append(["iOS", "Install", 120, 130.0, 0.5])
+    ws.append(["iOS", "Signup", 80, None, 0.25])
+    ws.append(["Android", "Install", 200, 210, ""])
+    ws.append(["Android", " Signup ", 90.0, 95, 1, "note"])
+    ws.append([])
+    path = str(tmp_path / "Personalization_Funnel.xlsx")
+    wb.save(path)
+
+    # what the loader rendered before it stopped going through pandas
+    df = pd.read_excel(path, header=None, engine="openpyxl")
+    expected = np.char.strip(df.to_numpy(dtype=str, na_value="")).tolist()
+    assert _funnel_rows(path) == expected
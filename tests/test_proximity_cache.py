@@ -0,0 +1,51 @@
+import numpy as np
+
+from modules.cache.proximity import ProximityCache
+
+
+def _unit(i, dim=4):
+    v = np.zeros(dim, dtype=np.float32)
+    v[i] = 1.0
+    return v
+
+
+def test_ring_buffer_evicts_oldest():
+    cache = ProximityCache(capacity=3, tau=0.95)
+    for i in range(4):
+        cache.put(_unit(i), f"v{i}")
+    assert cache.size == 3
+    assert cache.get(_unit(0)) is None  # overwritten by the fourth entry
+    assert [cache.get(_unit(i)) for i in (1, 2, 3)] == ["v1", "v2", "v3"]
+
+    # wraps around again: the next put replaces the oldest remaining entry
+    cache.put(_unit(0), "v0 again")
+    assert cache.get(_unit(1)) is None
+    assert cache.get(_unit(0)) == "v0 again"
+
+
+def test_near_duplicate_queries_hit():
+    cache = ProximityCache(capacity=4, tau=0.95)
+    cache.put([1.0, 0.0, 0.0, 0.0], "docs")
+    # scale does not matter, only the angle
+    assert cache.get([3.0, 0.1, 0.0, 0.0]) == "docs"       # cos ~ 0.999
+    assert cache.get([1.0, 0.3, 0.0, 0.0]) == "docs"       # cos ~ 0.958
+    assert cache.get([1.0, 0.4, 0.0, 0.0]) is None          # cos ~ 0.928
+    assert cache.get([0.0, 1.0, 0.0, 0.0]) is None
+
+
+def test_best_match_wins_and_clear_empties():
+    cache = ProximityCache(capacity=4, tau=0.9)
+    cache.put([1.0, 0.2, 0.0, 0.0], "near")
+    cache.put([1.0, 0.45, 0.0, 0.0], "far")
+    assert cache.get([1.0, 0.1, 0.0, 0.0]) == "near"
+    cache.clear()
+    assert cache.get([1.0, 0.2, 0.0, 0.0]) is None
+
+
+def test_dimension_change_resets():
+    cache = ProximityCache(capacity=2, tau=0.95)
+    cache.put(_unit(0, 4), "four")
+    assert cache.get(_unit(0, 3)) is None
+    cache.put(_unit(0, 3), "three")
+    assert cache.size == 1
+    assert cache.get(_unit(0, 3)) == "three"
@@ -0,0 +1,101 @@
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+import modules.retriever as retriever_mod
+from modules.retriever import QueryCache, Retriever
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic vectors; records each call so tests can count embedding passes."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _vec(self, text):
+        return [float(len(text)), float(ord(text[0])), 1.0]
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return self._vec(text)
+
+
+class FakeDB:
+    def __init__(self, tag="db"):
+        self.tag = tag
+        self.embedding_function = FakeEmbeddings()
+        self.searches = 0
+
+    def similarity_search_by_vector(self, vec, k):
+        self.searches += 1
+        return [Document(page_content=f"{self.tag}:{vec[1]:.0f}:{i}") for i in range(k)]
+
+
+def _contents(docs):
+    return [d.page_content for d in docs]
+
+
+def test_query_cache_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(retriever_mod.time, "monotonic", lambda: now[0])
+    cache = QueryCache(maxsize=4, ttl=10)
+    cache.put("q", [Document(page_content="x")])
+    now[0] += 10
+    assert _contents(cache.get("q")) == ["x"]
+    now[0] += 0.5
+    assert cache.get("q") is None
+    assert cache.get("q") is None  # expired entries are dropped, not kept around
+
+
+def test_query_cache_lru_eviction():
+    cache = QueryCache(maxsize=2, ttl=60)
+    cache.put("a", [])
+    cache.put("b", [])
+    assert cache.get("a") == []  # "a" becomes most recent
+    cache.put("c", [])
+    assert cache.get("b") is None
+    assert cache.get("a") == [] and cache.get("c") == []
+
+
+def test_query_cache_returns_copies():
+    cache = QueryCache()
+    cache.put("q", [Document(page_content="x")])
+    cache.get("q").clear()
+    assert _contents(cache.get("q")) == ["x"]
+
+
+def test_db_setter_invalidates_cached_results():
+    r = Retriever({"k": 2, "proximity_cache": {"enabled": True}}, FakeDB("old"))
+    assert _contents(r.search("hello")) == ["old:104:0", "old:104:1"]
+    assert _contents(r.search("hello")) == ["old:104:0", "old:104:1"]
+    assert r.stats == {"hits": 1, "misses": 1}
+
+    r.db = FakeDB("new")
+    assert _contents(r.search("hello")) == ["new:104:0", "new:104:1"]
+    assert r.db.searches == 1
+
+
+def test_batch_search_matches_sequential_search():
+    queries = ["beta", "alpha", "beta", "gamma", "delta", "alpha"]
+    cfg = {"k": 2, "search_threads": 4}
+    sequential = Retriever(dict(cfg), FakeDB())
+    expected = [_contents(sequential.search(q)) for q in queries]
+
+    db = FakeDB()
+    batched = Retriever(dict(cfg), db)
+    assert [_contents(d) for d in batched.batch_search(queries)] == expected
+    # duplicates are searched once, and misses are embedded in a single call
+    assert db.searches == 4
+    assert db.embedding_function.calls == [["beta", "alpha", "gamma", "delta"]]
+
+
+def test_search_with_embedding_skips_embedding_and_shares_cache():
+    db = FakeDB()
+    r = Retriever({"k": 1}, db)
+    vec = r.embed_query("zeta")
+    assert _contents(r.search_with_embedding("zeta", vec)) == _contents(r.search("zeta"))
+    assert db.embedding_function.calls == [["zeta"]]
+    assert db.searches == 1
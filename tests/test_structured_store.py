@@ -0,0 +1,175 @@
+import sqlite3
+from datetime import date
+
+from modules.store.structured_store import StructuredStore
+
+
+def _legacy_db(path):
+    """A store file from before the integer day columns existed."""
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE statuses(slide INTEGER, area TEXT, status TEXT, color_hex TEXT);
+        CREATE TABLE milestones(slide INTEGER, title TEXT, date TEXT, raw_date TEXT, source TEXT);
+        CREATE TABLE spans(slide INTEGER, title TEXT, start_date TEXT, end_date TEXT, raw_range TEXT, source TEXT);
+        INSERT INTO milestones VALUES (1, 'Beta launch', '2025-03-14', '3/14', 'a.pptx');
+        INSERT INTO milestones VALUES (2, 'TBD review', NULL, 'Q3', 'a.pptx');
+        INSERT INTO spans VALUES (3, 'Pilot', '2025-02-20', '2025-03-05', '2/20-3/5', 'a.pptx');
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_migration_backfills_day_columns(tmp_path):
+    path = str(tmp_path / "s.sqlite")
+    _legacy_db(path)
+    store = StructuredStore(path)
+
+    days = dict(store.conn.execute("SELECT title, date_i FROM milestones").fetchall())
+    assert days == {"Beta launch": date(2025, 3, 14).toordinal(), "TBD review": None}
+    assert store.conn.execute("SELECT start_i, end_i FROM spans").fetchone() == (
+        date(2025, 2, 20).toordinal(),
+        date(2025, 3, 5).toordinal(),
+    )
+    store.close()
+
+
+def test_get_range_matches_milestones_and_overlapping_spans(tmp_path):
+    path = str(tmp_path / "s.sqlite")
+    _legacy_db(path)
+    store = StructuredStore(path)
+    store.bulk_load(
+        milestones=[{"slide": 4, "title": "GA", "date": "2025-04-01", "raw_date": "4/1", "source": "b.pptx"}],
+        spans=[{"slide": 5, "title": "Freeze", "start_date": "2025-03-30", "end_date": "2025-04-10", "source": "b.pptx"}],
+    )
+
+    ms, sp = store.get_range(date(2025, 3, 1), date(2025, 3, 31))
+    assert ms == [(1, "Beta launch", "2025-03-14")]
+    assert sorted(sp) == [(3, "Pilot", "2025-02-20", "2025-03-05"), (5, "Freeze", "2025-03-30", "2025-04-10")]
+
+    # bounds are inclusive on both ends
+    ms, sp = store.get_range(date(2025, 4, 1), date(2025, 4, 1))
+    assert ms == [(4, "GA", "2025-04-01")]
+    assert sp == [(5, "Freeze", "2025-03-30", "2025-04-10")]
+
+    assert store.get_range(date(2026, 1, 1), date(2026, 12, 31)) == ([], [])
+    store.close()
+
+
+def _status(slide, area):
+    return {"slide": slide, "area": area, "status": "At Risk", "color_hex": "#FF0000"}
+
+
+def test_read_cache_sees_own_writes(tmp_path):
+    store = StructuredStore(str(tmp_path / "s.sqlite"))
+    assert store.red_areas() == []
+    store.add_statuses([_status(1, "Onboarding")])
+    assert store.red_areas() == [(1, "Onboarding")]
+    store.close()
+
+
+def test_read_cache_invalidated_by_other_connection(tmp_path):
+    path = str(tmp_path / "s.sqlite")
+    reader, writer = StructuredStore(path), StructuredStore(path)
+    reader.add_statuses([_status(1, "Onboarding")])
+    assert reader.red_areas() == [(1, "Onboarding")]
+
+    # commits by another connection only show up through PRAGMA data_version
+    writer.add_statuses([_status(2, "Checkout")])
+    assert sorted(reader.red_areas()) == [(1, "Onboarding"), (2, "Checkout")]
+
+    # an uncommitted batch stays invisible, and so does the cached result
+    with writer.batch():
+        writer.reset()
+        assert len(reader.red_areas()) == 2
+    assert reader.red_areas() == []
+    reader.close()
+    writer.close()
+
+
+def test_read_cache_returns_copies(tmp_path):
+    store = StructuredStore(str(tmp_path / "s.sqlite"))
+    store.add_statuses([_status(1, "Onboarding")])
+    store.red_areas().clear()
+    assert store.red_areas() == [(1, "Onboarding")]
+    store.close()
+
+
+def _milestone(slide, title, day="2025-05-01"):
+    return {"slide": slide, "title": title, "date": day, "raw_date": day, "source": "a.pptx"}
+
+
+def test_title_search_keeps_substring_matches(tmp_path):
+    store = StructuredStore(str(tmp_path / "s.sqlite"))
+    store.add_milestones([_milestone(1, "Launch day"), _milestone(2, "Prelaunch review")])
+    # a token match on "Launch day" must not hide the substring match
+    assert sorted(store.get_milestone("launch")) == [
+        (1, "Launch day", "2025-05-01"),
+        (2, "Prelaunch review", "2025-05-01"),
+    ]
+    ms, _ = store.get_milestone_or_span("launch")
+    assert len(ms) == 2
+    store.close()
+
+
+def test_title_search_with_punctuation(tmp_path):
+    store = StructuredStore(str(tmp_path / "s.sqlite"))
+    store.add_milestones([_milestone(1, "C++ rollout"), _milestone(2, "C rollout plan")])
+    # "C++" loses its "++" in the FTS query; the LIKE still finds the exact title
+    assert sorted(store.get_milestone("C++ rollout")) == [
+        (1, "C++ rollout", "2025-05-01"),
+        (2, "C rollout plan", "2025-05-01"),
+    ]
+    assert store.status_by_area_like("C++") == []
+
+    # "launch-day" becomes the words launch, day*: a token hit on "Launch day"
+    # must not hide the substring hit on "Prelaunch-day sync"
+    store.add_milestones([_milestone(3, "Launch day"), _milestone(4, "Prelaunch-day sync")])
+    assert sorted(store.get_milestone("launch-day")) == [
+        (3, "Launch day", "2025-05-01"),
+        (4, "Prelaunch-day sync", "2025-05-01"),
+    ]
+    store.close()
+
+
+def test_title_search_matches_reordered_words(tmp_path):
+    store = StructuredStore(str(tmp_path / "s.sqlite"))
+    store.add_milestones([_milestone(1, "Launch of the beta")])
+    assert store.get_milestone("beta launch") == [(1, "Launch of the beta", "2025-05-01")]
+    store.close()
+
+
+def test_get_range_null_and_empty_span_dates(tmp_path):
+    path = str(tmp_path / "s.sqlite")
+    _legacy_db(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        INSERT INTO spans VALUES (10, 'Null start', NULL, '2025-03-10', '', 'a.pptx');
+        INSERT INTO spans VALUES (11, 'Null end', '2025-03-01', NULL, '', 'a.pptx');
+        INSERT INTO spans VALUES (12, 'Empty end', '2025-03-01', '', '', 'a.pptx');
+        INSERT INTO spans VALUES (13, 'Empty start', '', '2025-03-10', '', 'a.pptx');
+        INSERT INTO spans VALUES (14, 'Empty start, ended', '', '2025-01-10', '', 'a.pptx');
+        """
+    )
+    conn.commit()
+    conn.close()
+    store = StructuredStore(path)
+    store.add_spans([{"slide": 15, "title": "New empty start", "start_date": "", "end_date": "2025-04-01"}])
+    # a file migrated before empty starts were mapped is fixed on open
+    store.conn.execute("UPDATE spans SET start_i = NULL WHERE slide = 13")
+    store.conn.commit()
+    store.close()
+    store = StructuredStore(path)
+
+    # same rows as the text comparison the range query used to run: an empty
+    # start is open-ended, every other NULL or empty bound never matches
+    old = store.conn.execute(
+        "SELECT slide FROM spans WHERE start_date IS NOT NULL AND end_date IS NOT NULL "
+        "AND NOT(end_date < ? OR start_date > ?)",
+        ("2025-03-01", "2025-03-31"),
+    ).fetchall()
+    _, sp = store.get_range(date(2025, 3, 1), date(2025, 3, 31))
+    assert sorted(r[0] for r in sp) == sorted(r[0] for r in old) == [3, 13, 15]
+    store.close()
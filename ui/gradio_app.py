@@ -1,7 +1,14 @@
+import asyncio
+
 import gradio as gr
 from modules.chat_engine import ChatEngine
 from modules.indexer import IndexBuilder
 
+def _rebuild(cfg) -> IndexBuilder:
+    ib = IndexBuilder(cfg)
+    ib.build_index(force_rebuild=True)
+    return ib
+
 def launch_ui(chat: ChatEngine):
     with gr.Blocks() as app:
         gr.Markdown("# 📚 ASO Team AI Chatbot")
@@ -16,31 +23,58 @@ def launch_ui(chat: ChatEngine):
 
         status = gr.Markdown("")
 
+        # dev aid: how SQLite runs the planner's queries (SCAN on milestones/spans = missing index)
+        with gr.Accordion("Query plans", open=False):
+            plans_md = gr.Markdown("")
+            show_plans = gr.Button("Explain structured queries")
+
         def on_submit(message, state):
             if not isinstance(state, list):
                 state = []
-            reply = chat.chat(message)
             state = state + [
                 {"role": "user", "content": message},
-                {"role": "assistant", "content": reply}
+                {"role": "assistant", "content": ""}
             ]
-            return state, ""
+            # stream chunks into the assistant bubble as they arrive
+            for chunk in chat.chat_stream(message):
+                state[-1] = {"role": "assistant", "content": state[-1]["content"] + chunk}
+                yield state, ""
 
         def on_clear():
             chat.history.clear()
             return []
 
-        def on_reindex():
-            # show progress message first
-            yield None, "", "⏳ Rebuilding index…"
-            ib = IndexBuilder(chat.cfg)
-            ib.build_index(force_rebuild=True)
-            # swap the retriever db to the fresh one
-            chat.retriever.db = ib.db
-            yield None, "", "✅ Index rebuilt."
+        reindex_lock = asyncio.Lock()
+
+        async def on_reindex():
+            if reindex_lock.locked():
+                yield gr.update(), gr.update(), "⏳ A rebuild is already running…"
+                return
+            async with reindex_lock:
+                # show progress message first
+                yield None, "", "⏳ Rebuilding index…"
+                # build in a worker thread so chat keeps answering from the current index
+                ib = await asyncio.to_thread(_rebuild, chat.cfg)
+                # swap the retriever db to the fresh one (the setter drops cached results)
+                chat.retriever.db = ib.db
+                # chat reads through its own store; release the builder's connection
+                ib.store.close()
+                stats = chat.retriever.stats
+                yield None, "", f"✅ Index rebuilt. (query cache: {stats['hits']} hits / {stats['misses']} misses)"
+
+        def on_plans():
+            lines = []
+            for name, details in chat.store.query_plans().items():
+                lines.append(f"**{name}**")
+                for d in details:
+                    scan = d.startswith("SCAN") and "VIRTUAL TABLE" not in d
+                    flag = "⚠️ " if scan and ("milestones" in d or "spans" in d) else ""
+                    lines.append(f"- {flag}`{d}`")
+            return "\n".join(lines)
 
         msg.submit(on_submit, [msg, chatbot], [chatbot, msg])
         clear.click(on_clear, None, chatbot)
         reindex.click(on_reindex, None, [chatbot, msg, status], show_progress=True)
+        show_plans.click(on_plans, None, plans_md)
 
     app.launch()